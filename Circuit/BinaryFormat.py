@@ -0,0 +1,181 @@
+"""
+Binary circuit and solution files. A file is a magic string, the length of a JSON header, the header and then
+raw little-endian arrays aligned to ALIGNMENT bytes, so every array can be memory mapped (see read_arrays) and
+shared between processes without copying.
+
+A circuit file holds, for node and branch ids 0..n-1:
+    node_gnd        uint8 (nodes,)          1 for ground nodes
+    node_names      uint8 (bytes,)          utf-8 names, node k is node_names[node_name_offsets[k]:node_name_offsets[k + 1]]
+    branch_kind     int8 (branches,)        index in BRANCH_KINDS
+    branch_nodes    int32 (branches, 2)     node ids of branch.nodes
+    branch_value    float64 (branches,)
+    branch_control  int32 (branches, 2)     controlling (v+, v-) node ids, or (branch id, current_out_of node id), or -1
+    branch_names    uint8, with branch_name_offsets
+A solution file holds node_ids/voltages of the solved nodes and source_ids/source_currents of the tension sources.
+"""
+from __future__ import annotations
+import json
+import os
+import numpy as np
+from .Circuit import Circuit
+from .Node import Node
+from .Branch import Branch, Resistor, IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource, \
+                    TensionSource, IndependentTensionSource, CurrentDependentTensionSource, TensionDependentTensionSource
+
+MAGIC = b'SIMULADR'
+ALIGNMENT = 64
+
+BRANCH_KINDS = (Resistor, IndependentCurrentSource, IndependentTensionSource, CurrentDependentCurrentSource,
+                TensionDependentCurrentSource, CurrentDependentTensionSource, TensionDependentTensionSource)
+
+def write_arrays(path: str | os.PathLike, kind: str, arrays: dict[str, np.ndarray]) -> None:
+    """Writes named arrays in the binary container, tagged with kind."""
+    arrays = {name: np.ascontiguousarray(a, dtype=np.asarray(a).dtype.newbyteorder('<')) for name, a in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, a in arrays.items():
+        entries[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset += -(-a.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'kind': kind, 'version': 1, 'arrays': entries}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(len(header).to_bytes(8, 'little'))
+        file.write(header)
+        file.write(b'\0' * (start - file.tell()))
+        for name, a in arrays.items():
+            file.write(a.tobytes())
+            file.write(b'\0' * (-a.nbytes % ALIGNMENT))
+
+def read_arrays(path: str | os.PathLike, kind: str | None = None, mmap: bool = True) -> dict[str, np.ndarray]:
+    """
+    Reads the arrays of a binary file.
+    Args:
+        kind (str | None): Expected kind of file, checked if given
+        mmap (bool): Map the arrays read-only instead of reading them into memory
+    Returns:
+        dict[str, np.ndarray]: The arrays by name
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a circuit binary file.")
+        size = int.from_bytes(file.read(8), 'little')
+        header = json.loads(file.read(size))
+    if kind is not None and header['kind'] != kind:
+        raise Exception(f"{path} holds a {header['kind']}, not a {kind}.")
+    start = -(-(len(MAGIC) + 8 + size) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=start + entry['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=start + entry['offset']).reshape(shape)
+    return arrays
+
+def _encode_names(names: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    data = [name.encode() for name in names]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(d) for d in data])
+    return np.frombuffer(b''.join(data), dtype=np.uint8), offsets
+
+def _decode_names(data: np.ndarray, offsets: np.ndarray) -> list[str]:
+    blob = data.tobytes()
+    bounds = offsets.tolist()
+    return [blob[a:b].decode() for a, b in zip(bounds, bounds[1:])]
+
+def save_circuit(circuit: Circuit, path: str | os.PathLike) -> None:
+    """Saves the topology and values of a circuit, see the module documentation for the layout."""
+    kinds = {cls: k for k, cls in enumerate(BRANCH_KINDS)}
+    n_branches = len(circuit.branches)
+    branch_kind = np.empty(n_branches, dtype=np.int8)
+    branch_nodes = np.empty((n_branches, 2), dtype=np.int32)
+    branch_value = np.empty(n_branches, dtype=np.float64)
+    branch_control = np.full((n_branches, 2), -1, dtype=np.int32)
+    for b in circuit.branches:
+        if (kind := kinds.get(type(b))) is None:
+            raise Exception(f"{type(b).__name__} {b.name} can't be saved.")
+        branch_kind[b.id] = kind
+        branch_nodes[b.id] = (b.nodes[0].id, b.nodes[1].id)
+        branch_value[b.id] = b.value
+        if isinstance(b, TensionDependentCurrentSource):
+            branch_control[b.id] = (b.v_plus.id, b.v_minus.id)
+        elif isinstance(b, TensionDependentTensionSource):
+            branch_control[b.id] = (b.dep_n_plus.id, b.dep_n_minus.id)
+        elif isinstance(b, (CurrentDependentCurrentSource, CurrentDependentTensionSource)):
+            branch_control[b.id] = (b.branch_of_current.id, b.current_out_of.id)
+
+    node_names, node_name_offsets = _encode_names([n.name for n in circuit.nodes])
+    branch_names, branch_name_offsets = _encode_names([b.name for b in circuit.branches])
+    write_arrays(path, 'circuit', {
+        'node_gnd': np.array([n.gnd for n in circuit.nodes], dtype=np.uint8),
+        'node_names': node_names,
+        'node_name_offsets': node_name_offsets,
+        'branch_kind': branch_kind,
+        'branch_nodes': branch_nodes,
+        'branch_value': branch_value,
+        'branch_control': branch_control,
+        'branch_names': branch_names,
+        'branch_name_offsets': branch_name_offsets,
+    })
+
+def load_circuit(path: str | os.PathLike) -> Circuit:
+    """
+    Builds the circuit saved by save_circuit, with the same node and branch ids.
+    Returns:
+        Circuit: The circuit, unsolved
+    """
+    arrays = read_arrays(path, 'circuit')
+    node_names = _decode_names(arrays['node_names'], arrays['node_name_offsets'])
+    branch_names = _decode_names(arrays['branch_names'], arrays['branch_name_offsets'])
+    kinds = arrays['branch_kind'].tolist()
+    ends = arrays['branch_nodes'].tolist()
+    values = arrays['branch_value'].tolist()
+    controls = arrays['branch_control'].tolist()
+
+    circuit = Circuit()
+    with circuit.bulk():
+        nodes = [Node(circuit, gnd=bool(gnd), name=name) for gnd, name in zip(arrays['node_gnd'].tolist(), node_names)]
+        branches: list[Branch] = []
+        for kind, (a, b), value, (c, d), name in zip(kinds, ends, values, controls, branch_names):
+            cls = BRANCH_KINDS[kind]
+            if cls in (CurrentDependentCurrentSource, CurrentDependentTensionSource):
+                if not 0 <= c < len(branches):
+                    raise Exception(f"{name} is controlled by the branch {c}, which is not defined before it.")
+                branches.append(cls(value, nodes[a], nodes[b], branches[c], nodes[d], name=name))
+            elif cls in (TensionDependentCurrentSource, TensionDependentTensionSource):
+                branches.append(cls(value, nodes[a], nodes[b], nodes[c], nodes[d], name=name))
+            else:
+                branches.append(cls(value, nodes[a], nodes[b], name=name))
+    return circuit
+
+def save_solution(circuit: Circuit, path: str | os.PathLike) -> None:
+    """Saves the voltages of the solved nodes and the currents of the tension sources, keyed by node and branch id."""
+    solved = [n for n in circuit.nodes if n.solved and n.v is not None]
+    sources = [b for b in circuit.branches if isinstance(b, TensionSource) and b.i is not None]
+    write_arrays(path, 'solution', {
+        'node_ids': np.array([n.id for n in solved], dtype=np.int64),
+        'voltages': np.array([n.v for n in solved], dtype=np.float64),
+        'source_ids': np.array([b.id for b in sources], dtype=np.int64),
+        'source_currents': np.array([b.i for b in sources], dtype=np.float64),
+    })
+
+def load_solution(path: str | os.PathLike, circuit: Circuit | None = None) -> dict[str, np.ndarray]:
+    """
+    Reads a solution saved by save_solution, writing it into circuit if given (same node and branch ids).
+    Returns:
+        dict[str, np.ndarray]: node_ids, voltages, source_ids and source_currents, memory mapped
+    """
+    arrays = read_arrays(path, 'solution')
+    if circuit is not None:
+        for k, v in zip(arrays['node_ids'].tolist(), arrays['voltages'].tolist()):
+            circuit.nodes[k].v = v
+            circuit.nodes[k].solved = True
+        for k, i in zip(arrays['source_ids'].tolist(), arrays['source_currents'].tolist()):
+            circuit.branches[k].i = i # type:ignore
+        circuit.mark_solved()
+    return arrays
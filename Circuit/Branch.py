@@ -1,11 +1,27 @@
 from __future__ import annotations
+import math
 from typing import TYPE_CHECKING
 from abc import ABC, abstractmethod
-from .Equation import Equation
+from .Equation import Equation, SparseRow, VariableIndex
 
 if TYPE_CHECKING:
     from .Node import Node
 
+def path_tension_eq(circuit, from_node: 'Node', to_node: 'Node') -> Equation:
+    """
+    Sum of the tension equations of the branches on a path from from_node to to_node (see Circuit.get_path),
+    the voltage of from_node minus the voltage of to_node in mesh variables.
+    """
+    if (path := circuit.get_path(from_node, to_node)) is None:
+        raise Exception(f"Não há caminho entre {from_node.name} e {to_node.name}")
+
+    eq = Equation()
+    for branch, node in path:
+        tension_eq = branch.get_tension_eq(node)
+        for var in tension_eq:
+            eq[var] += tension_eq[var]
+    return eq
+
 class Branch(ABC):
     def __init__(self, nodes: list[Node], value:float, name:str=""):
         self.name = name
@@ -14,10 +30,22 @@ class Branch(ABC):
         self.loops = []
         self.value:float = value
 
+        self.id: int = -1
+        self.circuit = nodes[0].circuit
+        self.circuit.add_branch(self)
+
     @property
     def i(self) -> float | None:
         pass
 
+    def set_value(self, value:float) -> None:
+        """Changes the value of the branch in place (resistance, source value or gain)."""
+        self.value = value
+
+    def stamp_key(self):
+        """Everything the equations of the branch depend on besides the topology; its rows are restamped when it changes."""
+        return self.value
+
     @abstractmethod
     def get_current_eq(self, node: 'Node') -> Equation | None:
         pass
@@ -32,6 +60,20 @@ class Branch(ABC):
     def get_tension_aux_eq(self) -> Equation | None:
         return None
 
+    # SparseRow versions of the equations above, over the integer ids of a VariableIndex.
+    # The defaults convert the Equation; the common branches build the row directly.
+    def get_current_row(self, node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        eq = self.get_current_eq(node)
+        return None if eq is None else SparseRow.from_equation(eq, ids)
+
+    def get_aux_row(self, ids: VariableIndex) -> SparseRow | None:
+        eq = self.get_aux_eq()
+        return None if eq is None else SparseRow.from_equation(eq, ids)
+
+    def get_tension_row(self, from_node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        eq = self.get_tension_eq(from_node)
+        return None if eq is None else SparseRow.from_equation(eq, ids)
+
     def get_loop_voltage(self, from_node: 'Node') -> float:
         """Returns the voltage contribution of this branch when traversing from from_node"""
         if from_node not in self.nodes:
@@ -52,12 +94,18 @@ class Resistor(Branch):
     @property
     def y(self):
         return 1/self.r
+
+    def set_value(self, value:float) -> None:
+        self.r = value
+        self.value = value
     
     @property
     def i(self) -> float | None:
+        """Magnitude of the current through the resistor."""
+        if (results := self.circuit.results) is not None:
+            return None if math.isnan(i := results.currents[self.id]) else abs(i)
         if all([n.solved for n in self.nodes]):
-            tensions = [n.v for n in self.nodes if n.v]
-            return self.y * (max(tensions) - min(tensions))
+            return abs(self.nodes[0].v - self.nodes[1].v) / self.r # type: ignore
         else:
             return None
 
@@ -69,6 +117,16 @@ class Resistor(Branch):
         else:
             return None
     
+    def get_current_row(self, node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        if node == self.nodes[0]:
+            other = self.nodes[1]
+        elif node == self.nodes[1]:
+            other = self.nodes[0]
+        else:
+            return None
+        y = self.y
+        return SparseRow((ids(node), ids(other)), (y, -y))
+
     def get_aux_eq(self) -> None:
         return None
     
@@ -80,7 +138,7 @@ class Resistor(Branch):
     def get_tension_eq(self, from_node: 'Node') -> Equation | None:
         if from_node not in self.nodes:
             return None
-        return Equation(dict_eq=dict([ (l, 1 if l.branches[l.nodes.index(from_node)] == self else -1) for l in self.loops ])) * self.r
+        return Equation(dict_eq={ l: l.direction(self, from_node) * self.r for l in self.loops })
 
 class IndependentCurrentSource(Branch):
     def __init__(self, current:float, node1: 'Node', node2: 'Node', name:str=""):
@@ -97,6 +155,14 @@ class IndependentCurrentSource(Branch):
             return Equation({None : -self.i})
         else:
             return None
+
+    def get_current_row(self, node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        if node == self.nodes[0]:
+            return SparseRow((), (), self.i)
+        elif node == self.nodes[1]:
+            return SparseRow((), (), -self.i)
+        else:
+            return None
         
     def get_aux_eq(self) -> None:
         return None
@@ -109,8 +175,14 @@ class CurrentDependentCurrentSource(Branch):
         self.branch_of_current:Branch = branch_of_current
         self.current_out_of:Node = current_out_of
     
+    def set_value(self, value:float) -> None:
+        self.multiplier = value
+        self.value = value
+
     @property
     def i(self) -> float | None: 
+        if (results := self.circuit.results) is not None:
+            return None if math.isnan(i := results.currents[self.id]) else i
         if (branch_i:=self.branch_of_current.i) is not None:
             return self.multiplier * branch_i
         else:
@@ -122,7 +194,7 @@ class CurrentDependentCurrentSource(Branch):
         return Equation(dict_eq = {(self, self.nodes[0]): -1 if from_node == self.nodes[0] else 1})
     
     def get_tension_aux_eq(self) -> Equation:
-        return Equation({(self, self.nodes[0]): -1}) + Equation(dict([(l, 1 if l.branches[l.nodes.index(self.current_out_of)] == self.branch_of_current else -1) for l in self.branch_of_current.loops])) * self.multiplier
+        return Equation({(self, self.nodes[0]): -1}) + Equation({ l: l.direction(self.branch_of_current, self.current_out_of) * self.multiplier for l in self.branch_of_current.loops })
     
         
     def get_aux_eq(self) -> Equation | None:
@@ -146,8 +218,14 @@ class TensionDependentCurrentSource(Branch):
         self.v_plus:'Node' = v_plus
         self.v_minus:'Node' = v_minus
     
+    def set_value(self, value:float) -> None:
+        self.multiplier = value
+        self.value = value
+
     @property
     def i(self) -> float | None:
+        if (results := self.circuit.results) is not None:
+            return None if math.isnan(i := results.currents[self.id]) else i
         if self.v_plus.solved and self.v_minus.solved:
             return self.multiplier*(self.v_plus.v - self.v_minus.v) # type: ignore
         else:
@@ -170,46 +248,7 @@ class TensionDependentCurrentSource(Branch):
         return Equation(dict_eq = {(self, self.nodes[0]): -1 if from_node == self.nodes[0] else 1})
     
     def get_tension_aux_eq(self) -> Equation:
-        from collections import deque
-
-        eq = Equation({(self, self.v_minus): -1})
-
-        queue = deque()
-        queue.append((self.v_minus, []))  # (current_node, path_so_far)
-        visited = set()
-
-        path = None
-
-        while queue:
-            current_node, path_so_far = queue.popleft()
-
-            if current_node == self.v_plus:
-                path = path_so_far
-                break
-
-            visited.add(current_node)
-
-            for branch in current_node.branches:
-                if branch.nodes[0] == current_node:
-                    neighbor = branch.nodes[1]
-                elif branch.nodes[1] == current_node:
-                    neighbor = branch.nodes[0]
-                else:
-                    continue
-
-                if neighbor not in visited:
-                    queue.append((neighbor, path_so_far + [(branch, current_node)]))
-
-        if path is None:
-            raise Exception(f"Não há caminho entre {self.v_minus.name} e {self.v_plus.name}")
-
-        for branch, from_node in path:
-            tension_eq = branch.get_tension_eq(from_node)
-            if tension_eq is None:
-                raise Exception(f"O ramo {branch.name} não suporta get_tension_eq")
-            eq += tension_eq * -self.multiplier
-
-        return eq
+        return Equation({(self, self.nodes[0]): -1}) + path_tension_eq(self.circuit, self.v_minus, self.v_plus) * -self.multiplier
     
 class TensionSource(Branch):
     def __init__(self, value:float, n_minus:'Node', n_plus:'Node', name:str=""):
@@ -229,6 +268,14 @@ class TensionSource(Branch):
             return Equation({(self, self.nodes[0]):-1})
         else:
             return None
+
+    def get_current_row(self, node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        if node == self.nodes[1]:
+            return SparseRow((ids((self, self.nodes[0])),), (1,))
+        elif node == self.nodes[0]:
+            return SparseRow((ids((self, self.nodes[0])),), (-1,))
+        else:
+            return None
         
     def get_loop_voltage(self, from_node: 'Node') -> float:
         if from_node not in self.nodes:
@@ -257,12 +304,20 @@ class IndependentTensionSource(TensionSource):
 
     def get_aux_eq(self) -> Equation:
         return Equation({ self.n_plus:1, self.n_minus:-1, None:-self.value })
+
+    def get_aux_row(self, ids: VariableIndex) -> SparseRow:
+        return SparseRow((ids(self.n_plus), ids(self.n_minus)), (1, -1), -self.value)
     
     def get_tension_eq(self, from_node: 'Node') -> Equation | None:
         if from_node not in self.nodes:
             return None
         return Equation(dict_eq = {None: -self.value if from_node == self.n_minus else self.value})
 
+    def get_tension_row(self, from_node: 'Node', ids: VariableIndex) -> SparseRow | None:
+        if from_node not in self.nodes:
+            return None
+        return SparseRow((), (), -self.value if from_node == self.n_minus else self.value)
+
 class CurrentDependentTensionSource(TensionSource):
     def __init__(self, multiplier:float, n_minus:Node, n_plus:Node, branch_of_current: Branch, current_out_of: Node, name:str=""):
         super().__init__(multiplier, n_minus, n_plus, name=name)
@@ -274,6 +329,10 @@ class CurrentDependentTensionSource(TensionSource):
             and (n_plus.v - n_minus.v != (branch_of_current.i if branch_of_current.nodes[0] == current_out_of else -branch_of_current.i)): # type:ignore
             raise Exception(f"Impossible circuit!\n{n_plus.name} and {n_minus.name} cant have a CurrentDependentTensionSource of {self.multiplier}.")
         
+    def set_value(self, value:float) -> None:
+        self.multiplier = value
+        self.value = value
+
     def get_aux_eq(self) -> Equation | None:
         if (eq := self.branch_of_current.get_current_eq(self.current_out_of)):
             return (eq * self.multiplier) + Equation({(self, self.nodes[0]):-1})
@@ -294,7 +353,7 @@ class CurrentDependentTensionSource(TensionSource):
         return Equation(dict_eq = {(self, self.n_minus): -1 if from_node == self.n_minus else 1})
 
     def get_tension_aux_eq(self) -> Equation:
-        return Equation({(self, self.n_minus): -1}) + Equation(dict([(l, 1 if l.branches[l.nodes.index(self.current_out_of)] == self.branch_of_current else -1) for l in self.branch_of_current.loops])) * self.multiplier
+        return Equation({(self, self.n_minus): -1}) + Equation({ l: l.direction(self.branch_of_current, self.current_out_of) * self.multiplier for l in self.branch_of_current.loops })
 
 class TensionDependentTensionSource(TensionSource):
     def __init__(self, multiplier:float, n_minus:Node, n_plus:Node, dep_n_plus:Node, dep_n_minus:Node, name:str=""):
@@ -306,6 +365,10 @@ class TensionDependentTensionSource(TensionSource):
         if n_plus.solved and n_minus.solved and dep_n_plus.solved and dep_n_minus.solved and (n_plus.v - n_minus.v != multiplier*(dep_n_plus*dep_n_minus)): # type:ignore
             raise Exception(f"Impossible circuit!\n{n_plus.name} and {n_minus.name} cant have a TensionDependentTensionSource of {self.multiplier}.")
         
+    def set_value(self, value:float) -> None:
+        self.multiplier = value
+        self.value = value
+
     def get_aux_eq(self) -> Equation:
         return Equation({ (self, self.n_plus): -1, self.dep_n_plus:self.multiplier, self.dep_n_minus:-self.multiplier })
     
@@ -324,44 +387,5 @@ class TensionDependentTensionSource(TensionSource):
         return Equation(dict_eq = {(self, self.n_minus): -1 if from_node == self.n_minus else 1})
 
     def get_tension_aux_eq(self) -> Equation:
-        from collections import deque
-
-        eq = Equation({(self, self.n_minus): -1})
-
-        queue = deque()
-        queue.append((self.dep_n_minus, []))  # (current_node, path_so_far)
-        visited = set()
-
-        path = None
-
-        while queue:
-            current_node, path_so_far = queue.popleft()
-
-            if current_node == self.dep_n_plus:
-                path = path_so_far
-                break
-
-            visited.add(current_node)
-
-            for branch in current_node.branches:
-                if branch.nodes[0] == current_node:
-                    neighbor = branch.nodes[1]
-                elif branch.nodes[1] == current_node:
-                    neighbor = branch.nodes[0]
-                else:
-                    continue
-
-                if neighbor not in visited:
-                    queue.append((neighbor, path_so_far + [(branch, current_node)]))
-
-        if path is None:
-            raise Exception(f"Não há caminho entre {self.dep_n_minus.name} e {self.dep_n_plus.name}")
-
-        for branch, from_node in path:
-            tension_eq = branch.get_tension_eq(from_node)
-            if tension_eq is None:
-                raise Exception(f"O ramo {branch.name} não suporta get_tension_eq")
-            eq += tension_eq * -self.multiplier
-
-        return eq
+        return Equation({(self, self.n_minus): -1}) + path_tension_eq(self.circuit, self.dep_n_minus, self.dep_n_plus) * -self.multiplier
 
@@ -1,13 +1,41 @@
 import numpy as np
+from contextlib import contextmanager
 from .Node import Node
 from .Branch import Resistor, IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource, \
                     IndependentTensionSource, CurrentDependentTensionSource ,TensionDependentTensionSource, TensionSource, Branch
-from .Equation import Equation
+from .Equation import Equation, SparseRow, VariableIndex
+from .LinearSystem import LinearSystem
+from .Instrumentation import phase, annotate
+from .PreparedCircuit import PreparedCircuit
+from .PathTree import PathTree
+from .DisjointSet import DisjointSet
+from .Results import Results
+
+# Branch and equation types used by the package and the analyzers through this module (see __init__.py)
+__all__ = ["Circuit", "Node", "Branch", "Equation", "Resistor", "IndependentCurrentSource", "CurrentDependentCurrentSource",
+           "TensionDependentCurrentSource", "IndependentTensionSource", "CurrentDependentTensionSource",
+           "TensionDependentTensionSource", "TensionSource", "LinearSystem", "PreparedCircuit"]
 
 class Circuit:
     def __init__(self):
         self.nodes: list[Node] = []
+        self.branches: list[Branch] = []
+        self.node_index: dict[str, Node] = {}
+        self.branch_index: dict[str, Branch] = {}
+        self.gnd: Node | None = None
         self.solved = False
+        self.system: LinearSystem | None = None
+        self.analysis: dict | None = None
+        # Bumped whenever a node or branch is added, for caches that depend on the topology only
+        self.topology_version = 0
+        self.path_tree: PathTree | None = None
+        self.bulk_depth = 0
+        self._results: Results | None = None
+        self._prepared: tuple | None = None
+        # (topology_version, ordering, variables, col_order) of the last sparse solve, see solve
+        self._ordering: tuple | None = None
+        # (variables, solution) of the last solve, the starting point of the 'cg' backend
+        self._last_solution: tuple | None = None
 
     def get_nodes(self) -> list[Node]:
         return self.nodes
@@ -22,30 +50,70 @@ class Circuit:
 
     def unsolve(self):
         self.solved = False
+        self._results = None
         for n in self.nodes:
             if not n.gnd:
                 n.unsolve()
 
     
     def add_node(self, node:Node) -> None:
+        node.id = len(self.nodes)
         self.nodes.append(node)
-        if self.solved:
+        self.node_index.setdefault(node.name, node)
+        if node.gnd and self.gnd is None:
+            self.gnd = node
+        self.topology_version += 1
+        if self.solved and not self.bulk_depth:
             self.unsolve()
 
+    @contextmanager
+    def bulk(self):
+        """
+        Context for adding many nodes and branches: a solved circuit is unsolved once at the end,
+        if the topology changed, instead of on every new node.
+        """
+        version = self.topology_version
+        self.bulk_depth += 1
+        try:
+            yield self
+        finally:
+            self.bulk_depth -= 1
+            if not self.bulk_depth and self.solved and self.topology_version != version:
+                self.unsolve()
+
+    def add_branch(self, branch:Branch) -> None:
+        branch.id = len(self.branches)
+        self.branches.append(branch)
+        self.branch_index.setdefault(branch.name, branch)
+        self.topology_version += 1
+        self._results = None
+
+    def get_path(self, from_node:Node, to_node:Node) -> list[tuple[Branch, Node]] | None:
+        """
+        A path between two nodes through branches with a tension equation, from a PathTree shared by
+        every query until the topology changes.
+        Returns:
+            list[tuple[Branch, Node]] | None: The branches, each with the node it is traversed from, or None if there is no path
+        """
+        if self.path_tree is None or self.path_tree.version != self.topology_version:
+            self.path_tree = PathTree(self)
+        return self.path_tree.path(from_node, to_node)
+
+    def get_branch(self, name:str) -> Branch | None:
+        return self.branch_index.get(name)
+
     def __getitem__(self, name:str):
-        for n in self.nodes:
-            if n.name == name:
-                return n
-        return None
+        return self.node_index.get(name)
 
     def get_nodal_eqs(self) -> list[Equation]:
         eqs:list[Equation] = list()
         for n in filter(lambda n: not n.solved, self.nodes):
             eqs.append(n.get_currents_eq())
 
-        for eq in eqs:
-            if self['GND'] in eq:
-                eq[self['GND']] = 0
+        if (gnd := self.gnd) is not None:
+            for eq in eqs:
+                if gnd in eq:
+                    eq[gnd] = 0
         return eqs
     
     def get_aux_eqs(self) -> list[Equation]:
@@ -53,32 +121,145 @@ class Circuit:
         for n in filter(lambda n: not n.solved, self.nodes):
             for eq in n.get_aux_eqs():
                 eqs.append(eq)
-        for eq in eqs:
-            if self['GND'] in eq:
-                eq[self['GND']] = 0
+        if (gnd := self.gnd) is not None:
+            for eq in eqs:
+                if gnd in eq:
+                    eq[gnd] = 0
         return eqs
     
-    def solve(self) -> dict:
-        eqs = [*self.get_nodal_eqs() , *self.get_aux_eqs()]
-        variables = set()
-        for eq in eqs:
-            variables.update(eq.variables)
-        if None in variables:
-            variables.remove(None)
-
-        args = []
-        ans = []
-        for eq in eqs[:]:
-            if not (line:=eq.get_line(variables)) in args:
-                args.append(line)
-                ans.append(-eq[None])
-            else:
-                eqs.remove(eq)
-        
-        np_args = np.array(args)
-        np_ans = np.array(ans)
-        solution = np.linalg.solve(np_args, np_ans)
+    def get_rows(self) -> tuple[list[SparseRow], VariableIndex, list[int]]:
+        """
+        The nodal and auxiliary equations as SparseRows, for LinearSystem.from_rows.
+        Returns:
+            tuple: (rows, variable ids, ids to leave out of the system)
+        """
+        ids = VariableIndex(self.nodes)
+        rows = [n.get_currents_row(ids) for n in self.nodes if not n.solved]
+        for b in self.branches:
+            if not all(n.solved for n in b.nodes) and (row := b.get_aux_row(ids)) is not None:
+                rows.append(row)
+        return rows, ids, [n.id for n in self.nodes if n.gnd]
+
+    def solve(self, backend: str = 'auto', executor=None, ordering: str = 'mmd', tol: float = 1e-10,
+              max_iter: int | None = None, preconditioner: str = 'jacobi', warm_start: bool = True) -> dict:
+        """
+        Solves the circuit by modified nodal analysis. Isolated islands, each with its own ground node, are solved
+        as separate systems. The fill-reducing column order of the sparse LU is computed once and reused by the
+        next solves until the topology or the set of unknowns changes.
+        The 'cg' backend solves circuits of positive resistors and current sources by preconditioned conjugate gradient,
+        by default starting from the previous solution, e.g. when solving again for new values in a sweep; the
+        iteration count and residuals are kept in self.system.convergence.
+        Args:
+            backend (str): 'dense', 'sparse', 'cg' or 'auto' (sparse LU for large circuits), see LinearSystem.solve
+            executor (concurrent.futures.Executor | None): Pool to solve the islands in, see LinearSystem.solve
+            ordering (str): 'mmd', 'colamd', 'rcm' or 'natural', see Ordering
+            tol (float): Relative residual the 'cg' backend stops at
+            max_iter (int | None): Iteration limit of the 'cg' backend, 10 times the number of unknowns if None
+            preconditioner (str): 'jacobi', 'ic' or 'none', see ConjugateGradient
+            warm_start (bool): Start the 'cg' backend from the previous solution instead of zero
+        Returns:
+            dict: The value of every variable, keyed by Node or (TensionSource, Node)
+        """
+        with phase('Circuit.solve'):
+            with phase('rows'):
+                rows = self.get_rows()
+            with phase('assemble'):
+                self.system = LinearSystem.from_rows(*rows)
+                annotate(**self.system.stats())
+            cached = self._ordering
+            reuse = cached is not None and cached[:2] == (self.topology_version, ordering) and cached[2] == self.system.variables
+            x0 = self.last_solution(self.system.variables) if backend == 'cg' and warm_start else None
+            # Isolated islands need a ground node each
+            solution = self.system.solve(backend, executor, ordering, cached[3] if reuse else None, # type:ignore
+                                         tol, max_iter, x0, preconditioner, split=len(rows[2]) > 1)
+            self._last_solution = (self.system.variables, solution)
+            if self.system.col_order is not None and not reuse:
+                self._ordering = (self.topology_version, ordering, self.system.variables, self.system.col_order)
+            annotate(ordering_reused=reuse)
+            with phase('write_back'):
+                return self.write_back(self.system.variables, solution)
+
+    def last_solution(self, variables: list) -> np.ndarray | None:
+        """The last solution ordered as variables, zero for variables it doesn't have; None before the first solve."""
+        if self._last_solution is None:
+            return None
+        last_variables, last = self._last_solution
+        if last_variables == variables:
+            return last
+        values = dict(zip(last_variables, last.tolist()))
+        return np.array([values.get(v, 0.0) for v in variables])
+
+    def estimate_sizes(self) -> dict[str, int]:
+        """
+        Estimates the number of unknowns of each analysis without building the equations.
+        Nodal: one voltage per unsolved node, plus the current of every tension source and controlled current source.
+        Mesh: E - N + C independent loops (C connected parts), plus the auxiliary variable of every controlled source.
+        Returns:
+            dict[str, int]: {'nodal': size, 'mesh': size}
+        """
+        parts = DisjointSet(len(self.nodes))
+        edges = 0
+        components = len(self.nodes)
+        for b in self.branches:
+            if b.nodes[0] != b.nodes[1]:
+                edges += 1
+            if parts.union(b.nodes[0].id, b.nodes[1].id):
+                components -= 1
+
+        controlled = (CurrentDependentCurrentSource, TensionDependentCurrentSource, CurrentDependentTensionSource, TensionDependentTensionSource)
+        n_controlled = sum(isinstance(b, controlled) for b in self.branches)
+        n_currents = sum(isinstance(b, (TensionSource, CurrentDependentCurrentSource, TensionDependentCurrentSource))
+                         and not all(n.solved for n in b.nodes) for b in self.branches)
+        return {
+            'nodal': sum(not n.solved for n in self.nodes) + n_currents,
+            'mesh': edges - len(self.nodes) + components + n_controlled,
+        }
+
+    def analyze(self, method: str = 'auto', backend: str = 'auto') -> dict:
+        """
+        Solves the circuit by nodal (Circuit.solve) or mesh (LoopAnalyzer.solve) analysis.
+        With 'auto' the analysis with the smaller estimated system is used, nodal on a tie or if the mesh solve fails.
+        The choice, the estimated sizes and the actual size are kept in self.analysis.
+        Args:
+            method (str): 'nodal', 'mesh' or 'auto'
+            backend (str): 'dense', 'sparse' or 'auto', see LinearSystem.solve
+        Returns:
+            dict: The value of every variable, keyed by Node or (TensionSource, Node), as Circuit.solve
+        """
+        from .LoopAnalyzer import LoopAnalyzer
+
+        estimated = self.estimate_sizes()
+        fallback = None
+        if method not in ('auto', 'nodal', 'mesh'):
+            raise Exception(f"Unknown analysis method: {method}")
+
+        if method == 'mesh' or (method == 'auto' and estimated['mesh'] < estimated['nodal']):
+            try:
+                analyzer = LoopAnalyzer(self)
+                analyzer.solve(backend)
+                answer = {n: n.v for n in self.nodes if n.solved and not n.gnd}
+                answer.update({(b, b.nodes[0]): b.i for b in self.branches if isinstance(b, TensionSource)})
+                self.analysis = {'method': 'mesh', 'estimated': estimated, 'size': analyzer.system.shape[1]}
+                return answer
+            except Exception as e:
+                if method == 'mesh':
+                    raise
+                # The mesh equations don't cover every circuit the nodal ones do
+                fallback = str(e)
+                self.unsolve()
 
+        answer = self.solve(backend)
+        self.analysis = {'method': 'nodal', 'estimated': estimated, 'size': self.system.shape[1]} # type:ignore
+        if fallback is not None:
+            self.analysis['fallback'] = fallback
+        return answer
+
+    def write_back(self, variables:list, solution) -> dict:
+        """
+        Stores a solution in the nodes (v) and tension sources (i) and marks the circuit as solved.
+        Returns:
+            dict: The solution keyed by variable
+        """
         answer = {}
         for v, s in zip(variables, solution):
             answer[v] = s
@@ -90,6 +271,76 @@ class Circuit:
             elif issubclass(type(var[0]), TensionSource):
                 var[0].i = answer[var]        
 
-        self.solved = True
+        self.mark_solved()
 
         return answer
+
+    def mark_solved(self) -> None:
+        """Marks the circuit as solved once the node voltages and tension source currents are stored, dropping stale results."""
+        self.solved = True
+        self._results = None
+
+    @property
+    def results(self) -> Results | None:
+        """
+        Every branch current, voltage and power of the solved circuit, computed together on first use after
+        each solve (see Results). None while the circuit is not solved.
+        """
+        if not self.solved:
+            return None
+        if self._results is None:
+            self._results = Results(self)
+        return self._results
+
+    def prepare(self, backend: str = 'auto') -> PreparedCircuit:
+        """
+        Analyses the circuit once for repeated solves where only branch values change, see PreparedCircuit.
+        """
+        return PreparedCircuit(self, backend)
+
+    def prepared(self, backend: str = 'auto') -> PreparedCircuit:
+        """
+        A PreparedCircuit kept until the topology changes, shared by the queries that reuse its factorization
+        (superposition, thevenin). Rows whose values changed since, including the values inside the definition
+        of a subcircuit instance (see Branch.stamp_key), are restamped before it is returned.
+        """
+        if self._prepared is None or self._prepared[:2] != (self.topology_version, backend):
+            self._prepared = (self.topology_version, backend, PreparedCircuit(self, backend))
+        else:
+            self._prepared[2].update()
+        return self._prepared[2]
+
+    def sweep(self, values: dict, chunk_size: int | None = None) -> tuple[dict, dict]:
+        """
+        Solves the circuit for arrays of branch values, e.g. {"R1": np.array([...]), "VS": ...}, see PreparedCircuit.sweep.
+        The arrays are broadcast together and paired index by index, variant k taking the k-th value of every array;
+        for every combination of values, pass arrays from np.meshgrid.
+        Returns:
+            tuple[dict, dict]: (node voltages keyed by node name, TensionSource currents keyed by branch name)
+        """
+        return self.prepare('dense').sweep(values, chunk_size)
+
+    def superposition(self, sources: list | None = None, backend: str = 'auto') -> tuple[list[Branch], np.ndarray]:
+        """
+        Contribution of each independent source to every node voltage, see PreparedCircuit.superposition.
+        Returns:
+            tuple[list[Branch], np.ndarray]: (the sources, contributions of shape (nodes, sources) indexed by Node.id)
+        """
+        return self.prepared(backend).superposition(sources)
+
+    def thevenin(self, pairs: list[tuple], backend: str = 'auto') -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Thevenin voltage and resistance and Norton current seen from every (a, b) node pair, see PreparedCircuit.thevenin.
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: (voltages, resistances, currents), one value per pair
+        """
+        return self.prepared(backend).thevenin(pairs)
+
+    def sensitivity(self, outputs, backend: str = 'auto') -> np.ndarray:
+        """
+        Derivative of outputs (node voltages or branch currents) by the value of every branch, with one adjoint solve
+        per output, see PreparedCircuit.sensitivity.
+        Returns:
+            np.ndarray: indexed by Branch.id, shape (outputs, branches) for a list of outputs
+        """
+        return self.prepared(backend).sensitivity(outputs)
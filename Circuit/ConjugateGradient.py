@@ -0,0 +1,145 @@
+"""
+Preconditioned conjugate gradient for symmetric positive-definite systems, such as the nodal matrix of a circuit made
+of positive resistors and current sources only: a resistive grid too large for a sparse LU. The matrix is only used
+through a COO matrix-vector product (np.bincount), so the memory stays proportional to the non-zeros.
+
+    preconditioner 'jacobi'  the diagonal, NumPy only
+                   'ic'      incomplete Cholesky with no fill, IC(0); fewer iterations, needs scipy for the
+                             triangular solves and a Python loop over the rows to build
+                   'none'    plain conjugate gradient
+"""
+import math
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+except ImportError: # only the 'ic' preconditioner needs scipy
+    sparse = None
+    sparse_linalg = None
+
+PRECONDITIONERS = ('jacobi', 'ic', 'none')
+
+def is_spd(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, size: int) -> bool:
+    """
+    Sufficient test for a symmetric positive-definite matrix in COO form with no repeated entries: symmetric, with a
+    positive diagonal and every row weakly diagonally dominant, strictly in at least one row. It is definite if, as in
+    a connected circuit, every part of the matrix has a strictly dominant row, otherwise the solve doesn't converge.
+    """
+    diagonal = rows == cols
+    if len(data) == 0 or np.count_nonzero(diagonal) != size:
+        return False
+    by_row, by_col = np.lexsort((cols, rows)), np.lexsort((rows, cols))
+    if not (np.array_equal(rows[by_row], cols[by_col]) and np.array_equal(cols[by_row], rows[by_col])):
+        return False
+    scale = np.abs(data).max()
+    if not np.allclose(data[by_row], data[by_col], rtol=1e-12, atol=1e-14 * scale):
+        return False
+    diag = np.zeros(size)
+    diag[rows[diagonal]] = data[diagonal]
+    off = np.bincount(rows[~diagonal], weights=np.abs(data[~diagonal]), minlength=size)
+    margin = diag - off
+    return bool(np.all(diag > 0) and np.all(margin >= -1e-12 * diag) and np.any(margin > 1e-12 * diag))
+
+def incomplete_cholesky(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, size: int):
+    """
+    IC(0) factor of a symmetric positive-definite matrix: L with the pattern of its lower triangle and L L^T close to it.
+    Returns:
+        scipy.sparse.csr_matrix: L
+    """
+    if sparse is None:
+        raise Exception("The 'ic' preconditioner needs scipy installed.")
+    lower = sparse.csr_matrix((data[rows >= cols], (rows[rows >= cols], cols[rows >= cols])), shape=(size, size))
+    lower.sum_duplicates()
+    lower.sort_indices()
+    ptr, idx, val = lower.indptr.tolist(), lower.indices.tolist(), lower.data.tolist()
+    for i in range(size):
+        start, end = ptr[i], ptr[i + 1]
+        position = {idx[k]: k for k in range(start, end)}
+        for k in range(start, end):
+            j = idx[k]
+            s = val[k]
+            # Row j is complete and ends with its diagonal
+            for kk in range(ptr[j], ptr[j + 1] - 1):
+                if (p := position.get(idx[kk])) is not None:
+                    s -= val[p] * val[kk]
+            if j < i:
+                val[k] = s / val[ptr[j + 1] - 1]
+            elif s <= 0:
+                raise Exception(f"Incomplete Cholesky breakdown at row {i}, use the 'jacobi' preconditioner.")
+            else:
+                val[k] = math.sqrt(s)
+    return sparse.csr_matrix((np.array(val), lower.indices, lower.indptr), shape=(size, size))
+
+def make_preconditioner(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, size: int, preconditioner: str):
+    """The function applying the inverse of the preconditioner to a residual."""
+    if preconditioner == 'jacobi':
+        diag = np.bincount(rows[rows == cols], weights=data[rows == cols], minlength=size)
+        inverse = 1 / diag
+        return lambda r: inverse * r
+    if preconditioner == 'ic':
+        # SuperLU in the natural order without pivoting keeps L as it is, and solves with it and its transpose
+        # several times faster than spsolve_triangular
+        lower = sparse_linalg.splu(incomplete_cholesky(rows, cols, data, size).tocsc(), permc_spec='NATURAL', diag_pivot_thresh=0)
+        return lambda r: lower.solve(lower.solve(r), trans='T')
+    if preconditioner == 'none':
+        return lambda r: r
+    raise Exception(f"Unknown preconditioner: {preconditioner}, expected one of {', '.join(PRECONDITIONERS)}")
+
+def pcg(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, rhs: np.ndarray, x0: np.ndarray | None = None,
+        tol: float = 1e-10, max_iter: int | None = None, preconditioner: str = 'jacobi') -> tuple[np.ndarray, dict]:
+    """
+    Solves A x = rhs, A symmetric positive-definite given by coordinates, by preconditioned conjugate gradient.
+    Args:
+        x0 (np.ndarray | None): Starting point, e.g. the solution for the previous values of a sweep; zero if None
+        tol (float): Relative residual |rhs - A x| / |rhs| to reach
+        max_iter (int | None): Iteration limit, 10 times the size if None
+        preconditioner (str): 'jacobi', 'ic' or 'none', see the module documentation
+    Returns:
+        tuple[np.ndarray, dict]: (x, {'preconditioner', 'iterations', 'residual', 'residuals', 'converged'}), residual
+                                 being the final relative residual |rhs - A x| / |rhs|, converged whether it is
+                                 at most tol, and residuals the estimate at every iteration
+    """
+    size = len(rhs)
+    max_iter = 10 * size if max_iter is None else max_iter
+
+    def matvec(x: np.ndarray) -> np.ndarray:
+        return np.bincount(rows, weights=data * x[cols], minlength=size)
+
+    apply = make_preconditioner(rows, cols, data, size, preconditioner)
+    x = np.zeros(size) if x0 is None else np.array(x0, dtype=float)
+    norm_rhs = np.linalg.norm(rhs)
+    if norm_rhs == 0:
+        x[:] = 0
+        return x, {'preconditioner': preconditioner, 'iterations': 0, 'residual': 0.0, 'residuals': [0.0], 'converged': True}
+
+    r = rhs - matvec(x)
+    z = apply(r)
+    p = z.copy()
+    rz = r @ z
+    residuals = [float(np.linalg.norm(r) / norm_rhs)]
+    iterations = 0
+    while True:
+        while residuals[-1] > tol and iterations < max_iter:
+            q = matvec(p)
+            alpha = rz / (p @ q)
+            x += alpha * p
+            r -= alpha * q
+            z = apply(r)
+            rz, previous = r @ z, rz
+            p = z + (rz / previous) * p
+            iterations += 1
+            residuals.append(float(np.linalg.norm(r) / norm_rhs))
+
+        # Convergence is decided on the true residual, as the recurrence drifts from it in long runs:
+        # if they disagree, the iterations restart from the true residual
+        r = rhs - matvec(x)
+        residual = float(np.linalg.norm(r) / norm_rhs)
+        if residual <= tol or iterations >= max_iter:
+            break
+        residuals[-1] = residual
+        z = apply(r)
+        p = z.copy()
+        rz = r @ z
+    return x, {'preconditioner': preconditioner, 'iterations': iterations, 'residual': residual,
+               'residuals': residuals, 'converged': residual <= tol}
@@ -0,0 +1,22 @@
+class DisjointSet:
+    """Union-find over the integers 0..n-1, with path halving."""
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, k: int) -> int:
+        parent = self.parent
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    def union(self, a: int, b: int) -> bool:
+        """
+        Returns:
+            bool: True if a and b were in different sets
+        """
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        self.parent[ra] = rb
+        return True
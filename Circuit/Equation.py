@@ -1,4 +1,17 @@
 from collections import defaultdict
+import numpy as np
+
+TOLERANCE = 1e-9
+
+def variable_order(var) -> tuple:
+    """Sort key for equation variables: the constant, nodes, branch currents, then anything else."""
+    if var is None:
+        return (0,)
+    if isinstance(var, tuple):
+        return (2, var[0].id, var[1].id)
+    if (var_id := getattr(var, 'id', None)) is not None:
+        return (1, var_id)
+    return (3, id(var))
 
 class Equation:
     def __init__(self, dict_eq:dict|defaultdict=defaultdict(float)):
@@ -25,7 +38,8 @@ class Equation:
             self.dict.pop(key)
 
     def __mul__(self, other):
-        for key in self.dict:
+        # Multiplying by 0 removes the keys while iterating
+        for key in list(self.dict):
             self[key] *= other
         return self
 
@@ -48,3 +62,142 @@ class Equation:
             return self.dict == other.dict
         return False
 
+    def canonical(self, tol: float = TOLERANCE) -> tuple:
+        """
+        Hashable form of the equation: its non-zero (variable, coefficient) pairs sorted by variable,
+        scaled so the first variable has coefficient 1 and rounded to multiples of tol.
+        Equations that only differ by a factor or by rounding noise have the same canonical form.
+        """
+        terms = sorted(((var, coef) for var, coef in self.dict.items() if coef != 0), key=lambda t: variable_order(t[0]))
+        if not terms:
+            return ()
+        lead = terms[1][1] if terms[0][0] is None and len(terms) > 1 else terms[0][1]
+        return tuple((var, round(coef / lead / tol)) for var, coef in terms)
+
+def unique_equations(eqs: list[Equation], tol: float = TOLERANCE, drop_empty: bool = False) -> list[Equation]:
+    """
+    Keeps the first of every group of equivalent equations (same canonical form), in order.
+    Args:
+        eqs (list[Equation]): Equations to filter
+        tol (float): Relative tolerance of the coefficients, see Equation.canonical
+        drop_empty (bool): Also drop equations without any variable
+    Returns:
+        list[Equation]: The filtered equations
+    """
+    seen = set()
+    new = []
+    for eq in eqs:
+        key = eq.canonical(tol)
+        if key in seen or (drop_empty and all(var is None for var, _ in key)):
+            continue
+        seen.add(key)
+        new.append(eq)
+    return new
+
+
+class VariableIndex:
+    """
+    Dense integer ids for equation variables. A node's id is its Node.id; any other variable
+    (branch current, loop) gets the next free id after the nodes the first time it is seen.
+    """
+    __slots__ = ('nodes', 'ids', 'others')
+
+    def __init__(self, nodes: list):
+        self.nodes = nodes
+        self.ids: dict = {}
+        self.others: list = []
+
+    def __call__(self, var) -> int:
+        if 0 <= (var_id := getattr(var, 'id', -1)) < len(self.nodes) and self.nodes[var_id] is var:
+            return var_id
+        if (var_id := self.ids.get(var)) is None:
+            var_id = self.ids[var] = len(self.nodes) + len(self.others)
+            self.others.append(var)
+        return var_id
+
+    def __len__(self) -> int:
+        return len(self.nodes) + len(self.others)
+
+    def variable(self, var_id: int):
+        return self.nodes[var_id] if var_id < len(self.nodes) else self.others[var_id - len(self.nodes)]
+
+class SparseRow:
+    """
+    Compact equation: parallel arrays of variable ids (see VariableIndex) and coefficients plus a constant,
+    meaning sum(coef * x[index]) + const = 0. Ids may repeat, repeated terms add up.
+    Operations don't modify the row, they return a new one.
+    """
+    __slots__ = ('index', 'coef', 'const')
+
+    def __init__(self, index, coef, const: float = 0.0):
+        self.index: np.ndarray = np.asarray(index, dtype=np.int64)
+        self.coef: np.ndarray = np.asarray(coef, dtype=float)
+        self.const: float = const
+
+    @classmethod
+    def from_equation(cls, eq: Equation, ids: VariableIndex) -> 'SparseRow':
+        terms = [(ids(var), coef) for var, coef in eq.dict.items() if var is not None and coef != 0]
+        return cls([t[0] for t in terms], [t[1] for t in terms], eq.dict.get(None, 0.0))
+
+    @classmethod
+    def concatenate(cls, rows: list['SparseRow']) -> 'SparseRow':
+        if not rows:
+            return cls((), ())
+        return cls(np.concatenate([r.index for r in rows]), np.concatenate([r.coef for r in rows]), sum(r.const for r in rows))
+
+    def merged(self) -> 'SparseRow':
+        """The same row with sorted, unique ids and no zero coefficients."""
+        index, inverse = np.unique(self.index, return_inverse=True)
+        coef = np.bincount(inverse, weights=self.coef, minlength=len(index))
+        nonzero = coef != 0
+        return SparseRow(index[nonzero], coef[nonzero], self.const)
+
+    def __add__(self, other: 'SparseRow') -> 'SparseRow':
+        return SparseRow.concatenate([self, other]).merged()
+
+    def __mul__(self, other: float) -> 'SparseRow':
+        return SparseRow(self.index, self.coef * other, self.const * other)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> 'SparseRow':
+        return self * -1
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def to_equation(self, ids: VariableIndex) -> Equation:
+        eq = Equation()
+        for var_id, coef in zip(self.index.tolist(), self.coef.tolist()):
+            eq[ids.variable(var_id)] += coef
+        if self.const:
+            eq[None] += self.const
+        return eq
+
+def unique_rows(rows: np.ndarray, cols: np.ndarray, coefs: np.ndarray, consts: np.ndarray, tol: float = TOLERANCE) -> np.ndarray:
+    """
+    Vectorized unique_equations for rows in coordinate form: the canonical form of every row is built
+    from its entries sorted by column, scaled by the first coefficient and rounded to tol.
+    Args:
+        rows, cols, coefs (np.ndarray): Non-zero entries, sorted by row then column, without repeated (row, col)
+        consts (np.ndarray): Constant of every row
+    Returns:
+        np.ndarray: Indices of the rows to keep, the first of every group of equivalent rows
+    """
+    n_rows = len(consts)
+    counts = np.bincount(rows, minlength=n_rows)
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    lead = np.where(counts > 0, coefs[np.minimum(starts[:-1], max(0, len(coefs) - 1))] if len(coefs) else 0, consts)
+    lead[lead == 0] = 1
+    scaled = np.rint(coefs / lead[rows] / tol) + 0.0 # + 0.0 turns -0.0 into 0.0
+    scaled_consts = np.rint(consts / lead / tol) + 0.0
+
+    seen = set()
+    kept = []
+    for r in range(n_rows):
+        s, e = starts[r], starts[r + 1]
+        key = (cols[s:e].tobytes(), scaled[s:e].tobytes(), scaled_consts[r])
+        if key not in seen:
+            seen.add(key)
+            kept.append(r)
+    return np.array(kept, dtype=np.int64)
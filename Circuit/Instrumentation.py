@@ -0,0 +1,136 @@
+"""
+Opt-in instrumentation of the solvers. Inside a Profiler context every instrumented phase of Circuit.solve,
+NodalAnalyzer and LoopAnalyzer is recorded with its wall time, the change in allocated memory blocks and
+details such as the system size, the non-zero count and the rows dropped as duplicates:
+
+    with Profiler() as profiler:
+        circuit.solve()
+    profiler.summary()
+    profiler.chrome_trace('solve.json')   # chrome://tracing or https://ui.perfetto.dev
+
+Without an active Profiler, phase() and annotate() cost one list check.
+"""
+from __future__ import annotations
+import sys
+import json
+import time
+import numpy as np
+
+_active: list[Profiler] = []
+
+class _NoPhase:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+class _Phase:
+    def __init__(self, profiler: Profiler, name: str, info: dict):
+        self.profiler = profiler
+        self.record = {'name': name, 'depth': len(profiler.open), **info}
+
+    def __enter__(self):
+        self.profiler.open.append(self.record)
+        self.record['start'] = time.perf_counter() - self.profiler.origin
+        self.blocks = sys.getallocatedblocks()
+        return self.record
+
+    def __exit__(self, *exc):
+        self.record['seconds'] = time.perf_counter() - self.profiler.origin - self.record['start']
+        self.record['allocated_blocks'] = sys.getallocatedblocks() - self.blocks
+        self.profiler.open.pop()
+        self.profiler.phases.append(self.record)
+        return False
+
+def active() -> Profiler | None:
+    """The innermost active Profiler, or None."""
+    return _active[-1] if _active else None
+
+def phase(name: str, **info):
+    """Context manager recording a phase in the active Profiler, if any."""
+    return _Phase(_active[-1], name, info) if _active else _NO_PHASE
+
+def annotate(**info) -> None:
+    """Adds details to the innermost open phase of the active Profiler, if any."""
+    if _active and _active[-1].open:
+        _active[-1].open[-1].update(info)
+
+class Profiler:
+    """
+    Records the instrumented phases run inside its context, see the module documentation.
+    Phases can nest; each record has name, depth, start and seconds (from the start of the profiler),
+    allocated_blocks (net change of sys.getallocatedblocks) and the details of the phase.
+    """
+    def __init__(self, condition: bool = False):
+        """
+        Args:
+            condition (bool): Also estimate the 1-norm condition number of every solved system, which costs
+                              about one more factorization
+        """
+        self.condition = condition
+        self.phases: list[dict] = []
+        self.open: list[dict] = []
+        self.origin = time.perf_counter()
+
+    def __enter__(self) -> Profiler:
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.remove(self)
+        return False
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Returns:
+            dict[str, dict]: For every phase name: calls, total seconds and total allocated blocks
+        """
+        result: dict[str, dict] = {}
+        for record in self.phases:
+            entry = result.setdefault(record['name'], {'calls': 0, 'seconds': 0.0, 'allocated_blocks': 0})
+            entry['calls'] += 1
+            entry['seconds'] += record['seconds']
+            entry['allocated_blocks'] += record['allocated_blocks']
+        return result
+
+    def to_json(self, path: str | None = None) -> str:
+        """The phases, in the order they started, as JSON; also written to path if given."""
+        text = json.dumps(sorted(self.phases, key=lambda r: r['start']), default=_json_default, indent=1)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def chrome_trace(self, path: str | None = None) -> dict:
+        """The phases as Chrome trace events (microseconds); also written to path if given."""
+        events = []
+        for record in sorted(self.phases, key=lambda r: r['start']):
+            args = {k: v for k, v in record.items() if k not in ('name', 'start', 'seconds', 'depth')}
+            events.append({'name': record['name'], 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6, 'args': args})
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(trace, file, default=_json_default)
+        return trace
+
+def condition_estimate(matrix, factorization=None) -> float:
+    """
+    1-norm condition number of a square matrix: exact for a dense np.ndarray, estimated for a scipy sparse matrix
+    from its LU factors (see LinearSystem.Factorization), which are computed if not given.
+    """
+    if isinstance(matrix, np.ndarray):
+        return float(np.linalg.cond(matrix, 1)) if matrix.size else 0.0
+    from scipy.sparse.linalg import onenormest, LinearOperator
+    from .LinearSystem import Factorization
+    lu = factorization if factorization is not None else Factorization(matrix)
+    inverse = LinearOperator(matrix.shape, matvec=lu.solve, rmatvec=lambda x: lu.solve(x, transpose=True), dtype=float)
+    return float(onenormest(matrix) * onenormest(inverse))
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
@@ -0,0 +1,370 @@
+import numpy as np
+from .Equation import Equation, SparseRow, VariableIndex, unique_equations, unique_rows, variable_order
+from .Instrumentation import phase, annotate, active, condition_estimate
+from .DisjointSet import DisjointSet
+from .Ordering import PERMC_SPEC, check_ordering, rcm_order, bandwidth_profile
+from .ConjugateGradient import is_spd, pcg
+
+try:
+    from scipy import sparse
+    from scipy import linalg as dense_linalg
+    from scipy.sparse import linalg as sparse_linalg
+    from scipy.sparse import csgraph
+except ImportError: # scipy is only needed by the sparse backend
+    sparse = None
+    dense_linalg = None
+    sparse_linalg = None
+    csgraph = None
+
+SPARSE_THRESHOLD = 200
+
+class LinearSystem:
+    """
+    Coordinate (COO) form of a set of equations, A x = b.
+    Equivalent equations (see unique_equations) are kept only once.
+    """
+    def __init__(self, eqs: list[Equation], n_nodes: int = 0):
+        """
+        Args:
+            eqs (list[Equation]): The equations, one row each.
+            n_nodes (int): Number of nodes of the circuit; node variables are then looked up by Node.id.
+        """
+        node_cols = [-1] * n_nodes
+        other_cols: dict = {}
+        found: list = []
+
+        rows: list[int] = []
+        cols: list[int] = []
+        data: list[float] = []
+        rhs: list[float] = []
+        kept = unique_equations(eqs)
+        kept_ids = {id(eq) for eq in kept}
+        self.kept = np.array([k for k, eq in enumerate(eqs) if id(eq) in kept_ids], dtype=np.int64)
+        self.dropped = len(eqs) - len(kept)
+        for eq in kept:
+            terms = [(var, coef) for var, coef in eq.dict.items() if var is not None and coef != 0]
+            row = len(rhs)
+            for var, coef in terms:
+                if 0 <= (var_id := getattr(var, 'id', -1)) < n_nodes and node_cols[var_id] >= 0:
+                    col = node_cols[var_id]
+                elif (col := other_cols.get(var)) is None:
+                    col = len(found)
+                    found.append(var)
+                    if 0 <= var_id < n_nodes:
+                        node_cols[var_id] = col
+                    else:
+                        other_cols[var] = col
+                rows.append(row)
+                cols.append(col)
+                data.append(coef)
+            rhs.append(-eq.dict.get(None, 0))
+
+        # Columns in a reproducible order: nodes by id, then branch currents by branch id
+        order = sorted(range(len(found)), key=lambda k: variable_order(found[k]))
+        position = np.empty(len(found), dtype=np.int64)
+        position[order] = np.arange(len(found))
+
+        self.variables: list = [found[k] for k in order]
+        self.index: dict = {var: k for k, var in enumerate(self.variables)}
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = position[np.array(cols, dtype=np.int64)]
+        self.data = np.array(data, dtype=float)
+        self.rhs = np.array(rhs, dtype=float)
+        self.shape = (len(rhs), len(self.variables))
+        self.col_order: np.ndarray | None = None
+        self.convergence: dict | None = None
+
+    @classmethod
+    def from_rows(cls, rows: list[SparseRow], ids: VariableIndex, exclude: list[int] = []) -> 'LinearSystem':
+        """
+        Builds the system from SparseRows with NumPy, without creating an Equation per row.
+        Repeated ids in a row are added up and equivalent rows are kept once (see unique_rows).
+        Args:
+            rows (list[SparseRow]): The rows
+            ids (VariableIndex): The ids the rows were built with
+            exclude (list[int]): Variable ids left out of the system, e.g. the ground node
+        """
+        system = cls([])
+        n_vars = max(1, len(ids))
+        lengths = np.array([len(r) for r in rows], dtype=np.int64)
+        row_of = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+        var = np.concatenate([r.index for r in rows]) if rows else np.zeros(0, dtype=np.int64)
+        coef = np.concatenate([r.coef for r in rows]) if rows else np.zeros(0)
+        consts = np.array([r.const for r in rows], dtype=float)
+
+        # Add up repeated (row, variable) entries, drop zeros and excluded variables
+        keys, inverse = np.unique(row_of * n_vars + var, return_inverse=True)
+        coef = np.bincount(inverse, weights=coef, minlength=len(keys))
+        row_of, var = keys // n_vars, keys % n_vars
+        keep = (coef != 0) & ~np.isin(var, exclude)
+        row_of, var, coef = row_of[keep], var[keep], coef[keep]
+
+        # Columns in a reproducible order: nodes by id, then branch currents by branch id
+        used = np.unique(var)
+        found = [ids.variable(k) for k in used.tolist()]
+        order = sorted(range(len(found)), key=lambda k: variable_order(found[k]))
+        col_of = np.zeros(n_vars, dtype=np.int64)
+        col_of[used[order]] = np.arange(len(order))
+        col = col_of[var]
+
+        sort = np.lexsort((col, row_of))
+        row_of, col, coef = row_of[sort], col[sort], coef[sort]
+        kept = unique_rows(row_of, col, coef, consts)
+        new_row = np.full(len(rows), -1, dtype=np.int64)
+        new_row[kept] = np.arange(len(kept))
+        in_kept = new_row[row_of] >= 0
+
+        system.kept = kept
+        system.dropped = len(rows) - len(kept)
+        system.variables = [found[k] for k in order]
+        system.index = {v: k for k, v in enumerate(system.variables)}
+        system.rows = new_row[row_of[in_kept]]
+        system.cols = col[in_kept]
+        system.data = coef[in_kept]
+        system.rhs = -consts[kept]
+        system.shape = (len(kept), len(system.variables))
+        return system
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict[str, int]:
+        """Size of the system: rows, columns, non-zeros and equations dropped as duplicates."""
+        return {'rows': self.shape[0], 'columns': self.shape[1], 'nnz': self.nnz, 'dropped': self.dropped}
+
+    def to_dense(self) -> np.ndarray:
+        matrix = np.zeros(self.shape)
+        np.add.at(matrix, (self.rows, self.cols), self.data)
+        return matrix
+
+    def to_csc(self):
+        if sparse is None:
+            raise Exception("The sparse backend needs scipy installed.")
+        return sparse.csc_matrix((self.data, (self.rows, self.cols)), shape=self.shape)
+
+    def blocks(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Independent parts of the system, e.g. the electrically isolated islands of a circuit: the connected components
+        of the graph joining every row to the columns it uses.
+        Returns:
+            list[tuple[np.ndarray, np.ndarray]]: (rows, columns) of every part, in increasing order
+        """
+        n_rows, n_cols = self.shape
+        if csgraph is not None:
+            graph = sparse.coo_matrix((np.ones(self.nnz), (self.rows, n_rows + self.cols)), shape=(n_rows + n_cols,) * 2)
+            labels = csgraph.connected_components(graph, directed=False)[1]
+        else:
+            parts = DisjointSet(n_rows + n_cols)
+            for row, col in zip(self.rows.tolist(), (n_rows + self.cols).tolist()):
+                parts.union(row, col)
+            labels = np.array([parts.find(k) for k in range(n_rows + n_cols)], dtype=np.int64)
+        order = np.argsort(labels, kind='stable')
+        groups = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1) if len(order) else []
+        return [(group[group < n_rows], group[group >= n_rows] - n_rows) for group in groups]
+
+    def solve(self, backend: str = 'auto', executor=None, ordering: str = 'mmd', col_order: np.ndarray | None = None,
+              tol: float = 1e-10, max_iter: int | None = None, x0: np.ndarray | None = None, preconditioner: str = 'jacobi',
+              split: bool = False) -> np.ndarray:
+        """
+        Solves the system. With split, independent parts (see blocks) are solved as systems of their own, which costs
+        the sum of their cubes instead of the cube of their sum with the dense backend.
+        Args:
+            backend (str): 'dense' (np.linalg.solve), 'sparse' (scipy sparse LU) or 'auto',
+                           which picks 'sparse' for systems (or parts) with at least SPARSE_THRESHOLD variables.
+                           'cg' solves a symmetric positive-definite system by preconditioned conjugate gradient
+                           (see ConjugateGradient) and any other system as 'auto'.
+            executor (concurrent.futures.Executor | None): Pool the parts are solved in, e.g. a ThreadPoolExecutor;
+                                                           only arrays are sent, so a ProcessPoolExecutor works too.
+            ordering (str): Fill-reducing column ordering of the sparse backend: 'mmd', 'colamd', 'rcm' or 'natural'
+            col_order (np.ndarray | None): Column order of a previous solve of the same pattern, reused instead of
+                                           computing one; the order used is kept in self.col_order.
+            tol (float): Relative residual the 'cg' backend stops at
+            max_iter (int | None): Iteration limit of the 'cg' backend, 10 times the size if None
+            x0 (np.ndarray | None): Starting point of the 'cg' backend, ordered as self.variables
+            preconditioner (str): Preconditioner of the 'cg' backend: 'jacobi', 'ic' or 'none'
+            split (bool): Look for independent parts first, e.g. in a circuit with more than one ground node.
+                          With a sparse backend, self.col_order is then the column orders of the parts one after the other.
+        Returns:
+            np.ndarray: The solution, ordered as self.variables.
+        """
+        if backend == 'cg':
+            if self.shape[0] == self.shape[1] and is_spd(self.rows, self.cols, self.data, self.shape[0]):
+                return self.solve_cg(tol, x0, preconditioner, max_iter)
+            annotate(fallback='not symmetric positive-definite')
+            backend = 'auto'
+
+        blocks = self.blocks() if split and self.shape[0] == self.shape[1] and self.shape[0] else []
+        if len(blocks) <= 1:
+            backend = choose_backend(backend, self.shape[1])
+            with phase('LinearSystem.solve', backend=backend, **self.stats()):
+                if backend == 'dense':
+                    matrix, factorization = self.to_dense(), None
+                    solution = np.linalg.solve(matrix, self.rhs)
+                else:
+                    matrix = self.to_csc()
+                    factorization = Factorization(matrix, col_order, ordering)
+                    self.col_order = factorization.col_order
+                    solution = factorization.solve(self.rhs)
+                if (profiler := active()) is not None:
+                    if factorization is not None:
+                        annotate(ordering=factorization.ordering, fill=factorization.fill,
+                                 **bandwidth_profile(matrix, factorization.col_order))
+                    if profiler.condition:
+                        annotate(condition=condition_estimate(matrix, factorization))
+            return solution
+
+        with phase('LinearSystem.solve', backend=backend, blocks=len(blocks), largest=max(len(c) for _, c in blocks), **self.stats()):
+            # Local row and column of every entry inside its part
+            part = np.empty(self.shape[0], dtype=np.int64)
+            col_part = np.empty(self.shape[1], dtype=np.int64)
+            local_row = np.empty(self.shape[0], dtype=np.int64)
+            local_col = np.empty(self.shape[1], dtype=np.int64)
+            for k, (rows, cols) in enumerate(blocks):
+                part[rows] = k
+                col_part[cols] = k
+                local_row[rows] = np.arange(len(rows))
+                local_col[cols] = np.arange(len(cols))
+            entries = np.argsort(part[self.rows], kind='stable')
+            bounds = np.searchsorted(part[self.rows][entries], np.arange(len(blocks) + 1))
+            if col_order is not None:
+                # The given order, split into the local order of every part
+                given = col_order[np.argsort(col_part[col_order], kind='stable')]
+                given_bounds = np.searchsorted(col_part[given], np.arange(len(blocks) + 1))
+
+            tasks = []
+            for k, (rows, cols) in enumerate(blocks):
+                if len(rows) != len(cols):
+                    raise np.linalg.LinAlgError('Singular matrix')
+                e = entries[bounds[k]:bounds[k + 1]]
+                order = local_col[given[given_bounds[k]:given_bounds[k + 1]]] if col_order is not None else None
+                tasks.append((local_row[self.rows[e]], local_col[self.cols[e]], self.data[e], self.rhs[rows], len(cols), backend, ordering, order))
+            results = executor.map(solve_coo, *zip(*tasks)) if executor is not None else map(solve_coo, *zip(*tasks))
+
+            solution = np.empty(self.shape[1])
+            orders, fill, factored = [], 0, False
+            for (_, cols), (x, order, part_fill) in zip(blocks, results):
+                solution[cols] = x
+                # Parts solved dense keep their columns as they are
+                orders.append(cols if order is None else cols[order])
+                if order is not None:
+                    factored = True
+                    fill += part_fill
+            self.col_order = np.concatenate(orders) if factored else None
+            if (profiler := active()) is not None:
+                if self.col_order is not None:
+                    annotate(ordering=ordering if col_order is None else 'given', fill=fill,
+                             **bandwidth_profile(self.to_csc(), self.col_order))
+                if profiler.condition:
+                    annotate(condition=max(condition_estimate(coo_matrix(*task[:3], task[4], 'dense')) for task in tasks))
+        return solution
+
+    def solve_cg(self, tol: float = 1e-10, x0: np.ndarray | None = None, preconditioner: str = 'jacobi',
+                 max_iter: int | None = None) -> np.ndarray:
+        """
+        Solves a symmetric positive-definite system by preconditioned conjugate gradient (see ConjugateGradient.pcg),
+        keeping the iteration count and residuals in self.convergence.
+        """
+        with phase('LinearSystem.solve', backend='cg', **self.stats()):
+            solution, self.convergence = pcg(self.rows, self.cols, self.data, self.rhs, x0, tol, max_iter, preconditioner)
+            annotate(**{k: v for k, v in self.convergence.items() if k != 'residuals'})
+        if not self.convergence['converged']:
+            raise np.linalg.LinAlgError(f"Conjugate gradient did not converge in {self.convergence['iterations']} iterations "
+                                        f"(relative residual {self.convergence['residual']:.2e})")
+        return solution
+
+    def factorize(self, backend: str = 'auto', col_order: np.ndarray | None = None, ordering: str = 'mmd') -> 'Factorization':
+        backend = choose_backend(backend, self.shape[1])
+        return Factorization(self.to_dense() if backend == 'dense' else self.to_csc(), col_order, ordering)
+
+def coo_matrix(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, size: int, backend: str):
+    """Square matrix from coordinates, dense np.ndarray or scipy csc."""
+    if backend == 'dense':
+        matrix = np.zeros((size, size))
+        np.add.at(matrix, (rows, cols), data)
+        return matrix
+    return sparse.csc_matrix((data, (rows, cols)), shape=(size, size))
+
+def solve_coo(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, rhs: np.ndarray, size: int, backend: str = 'auto',
+              ordering: str = 'mmd', col_order: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray | None, int | None]:
+    """
+    Solves a square system given by coordinates, one part of LinearSystem.solve; module level so it can be pickled.
+    Returns:
+        tuple: (solution, column order and fill of the sparse LU, both None with the dense backend)
+    """
+    backend = choose_backend(backend, size)
+    matrix = coo_matrix(rows, cols, data, size, backend)
+    if backend == 'dense':
+        return np.linalg.solve(matrix, rhs), None, None
+    factorization = Factorization(matrix, col_order, ordering)
+    return factorization.solve(rhs), factorization.col_order, factorization.fill
+
+def choose_backend(backend: str, size: int) -> str:
+    if backend == 'auto':
+        return 'sparse' if sparse is not None and size >= SPARSE_THRESHOLD else 'dense'
+    if backend not in ('dense', 'sparse'):
+        raise Exception(f"Unknown backend: {backend}")
+    if backend == 'sparse' and sparse is None:
+        raise Exception("The sparse backend needs scipy installed.")
+    return backend
+
+class Factorization:
+    """
+    LU factors of a square matrix, reused for any number of right-hand sides.
+    A dense np.ndarray is factored with scipy.linalg.lu_factor (or kept for np.linalg.solve without scipy),
+    a scipy sparse matrix with scipy's sparse LU.
+    """
+    def __init__(self, matrix, col_order: np.ndarray | None = None, ordering: str = 'mmd'):
+        """
+        Args:
+            matrix: The matrix, np.ndarray or scipy sparse
+            col_order (np.ndarray | None): Fixed column order for a sparse matrix, e.g. the col_order of a
+                                           previous factorization of the same pattern. Computed if None.
+            ordering (str): Fill-reducing ordering computing the column order of a sparse matrix, see Ordering
+        """
+        if matrix.shape[0] != matrix.shape[1]:
+            raise np.linalg.LinAlgError('Last 2 dimensions of the array must be square')
+        self.shape = matrix.shape
+        self.sparse = not isinstance(matrix, np.ndarray)
+        self.col_order = col_order
+        self.ordering = check_ordering(ordering) if col_order is None else 'given'
+        self.fill: int | None = None
+
+        if self.sparse:
+            matrix = matrix.tocsc()
+            if col_order is None and ordering == 'rcm':
+                col_order = self.col_order = rcm_order(matrix)
+            try:
+                if col_order is None:
+                    self.lu = sparse_linalg.splu(matrix, permc_spec=PERMC_SPEC[ordering])
+                    self.col_order = np.argsort(self.lu.perm_c)
+                    self._inner_order = None
+                else:
+                    self.lu = sparse_linalg.splu(matrix[:, col_order], permc_spec='NATURAL')
+                    self._inner_order = col_order
+            except RuntimeError as e:
+                raise np.linalg.LinAlgError(str(e)) from e
+            # Non-zeros of L and U, the fill-in the ordering is meant to keep low
+            self.fill = int(self.lu.L.nnz + self.lu.U.nnz)
+        elif dense_linalg is not None:
+            self.lu = dense_linalg.lu_factor(matrix, check_finite=False)
+            if np.any(np.diag(self.lu[0]) == 0) or not np.all(np.isfinite(self.lu[0])):
+                raise np.linalg.LinAlgError('Singular matrix')
+        else:
+            self.lu = matrix
+
+    def solve(self, rhs: np.ndarray, transpose: bool = False) -> np.ndarray:
+        """
+        Solves A x = rhs (or A^T x = rhs). rhs may have one column per right-hand side.
+        """
+        if self.sparse:
+            if self._inner_order is None:
+                return self.lu.solve(rhs, trans='T' if transpose else 'N')
+            if transpose:
+                return self.lu.solve(rhs[self._inner_order], trans='T')
+            x = np.empty_like(rhs, dtype=float)
+            x[self._inner_order] = self.lu.solve(rhs)
+            return x
+        if dense_linalg is not None:
+            return dense_linalg.lu_solve(self.lu, rhs, trans=1 if transpose else 0, check_finite=False)
+        return np.linalg.solve(self.lu.T if transpose else self.lu, rhs)
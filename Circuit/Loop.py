@@ -1,10 +1,24 @@
-import Circuit
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .Node import Node
+    from .Branch import Branch
 
 class Loop:
-    def __init__(self, name:str, path:tuple[list[Circuit.Node], list[Circuit.Branch]]):
+    def __init__(self, name:str, path:tuple[list[Node], list[Branch]]):
         self.nodes = path[0]
         self.branches = path[1]
         self.name = name
+        # +1 where the loop goes through a branch from its nodes[0], -1 from its nodes[1]
+        self.signs: dict[Branch, int] = {b: 1 if n == b.nodes[0] else -1 for n, b in zip(self.nodes, self.branches)}
+
+    def direction(self, branch: Branch, from_node: Node) -> int:
+        """
+        Returns:
+            int: 1 if the loop goes through the branch starting at from_node, -1 otherwise
+        """
+        return self.signs[branch] if from_node == branch.nodes[0] else -self.signs[branch]
     
     def __str__(self):
         string:str = f"{self.name} : "
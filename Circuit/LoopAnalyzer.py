@@ -1,7 +1,11 @@
-from Circuit import Circuit, Branch
-from Loop import Loop
+from collections import deque
+from .Circuit import Circuit, Branch, TensionSource, IndependentTensionSource, Resistor, IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource
+from .Loop import Loop
 import numpy as np
-from Equation import Equation
+from .Equation import Equation, unique_equations
+from .LinearSystem import LinearSystem, sparse
+from .DisjointSet import DisjointSet
+from .Instrumentation import phase, annotate
 
 class LoopAnalyzer:
     def __init__(self, circuit: Circuit):
@@ -45,7 +49,29 @@ class LoopAnalyzer:
             for branch in loop.branches:
                 branch.loops.remove(loop)
 
-    def find_loops(self) -> list[Loop]:
+    def find_loops(self, method: str = 'fundamental') -> list[Loop]:
+        """
+        Finds the loops of the circuit.
+        Args:
+            method (str): 'fundamental' for a fundamental cycle basis (see find_fundamental_loops),
+                          'dfs' for the exhaustive search of every path, exponential in the circuit size
+        Returns:
+            list[Loop]: The loops
+        """
+        if method not in ('fundamental', 'dfs'):
+            raise Exception(f"Unknown loop search method: {method}")
+        with phase('find_loops', method=method):
+            if method == 'fundamental':
+                self.find_fundamental_loops()
+            else:
+                self.find_dfs_loops()
+            annotate(loops=len(self.loops))
+        return self.loops
+
+    def find_dfs_loops(self) -> list[Loop]:
+        """
+        Finds the loops by the exhaustive search of every path, keeping only the loops that add a node or a branch.
+        """
         for node in self.circuit.get_nodes():
             if node not in self.visited:
                 self._dfs(node, [], [])
@@ -65,6 +91,108 @@ class LoopAnalyzer:
 
         return self.loops
     
+    def find_fundamental_loops(self) -> list[Loop]:
+        """
+        Finds a fundamental cycle basis: a spanning forest of the circuit graph is built with a
+        union-find, and every branch left out of it (a chord) closes exactly one loop through the forest.
+        That gives E - N + C independent loops, in time linear in the size of the loops.
+        Tension sources enter the forest first and current sources last, so a current source is
+        a chord, and in a single loop, whenever the topology allows it.
+        Returns:
+            list[Loop]: The loops
+        """
+        # Loops left on the branches by any earlier analyzer of the circuit would be stale unknowns
+        self.loops = []
+        for b in self.circuit.branches:
+            b.loops = []
+
+        def priority(b: Branch) -> int:
+            if isinstance(b, TensionSource):
+                return 0
+            if isinstance(b, Resistor):
+                return 1
+            if isinstance(b, (IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource)):
+                return 3
+            return 2
+
+        nodes = self.circuit.get_nodes()
+
+        # Breadth-first depth from the ground: within a priority, branches close to the ground enter the
+        # forest first, which keeps it shallow and the loops short
+        depth = [-1] * len(nodes)
+        for start in ([self.circuit.gnd] if self.circuit.gnd is not None else []) + nodes:
+            if depth[start.id] >= 0:
+                continue
+            depth[start.id] = 0
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for b in node.branches:
+                    other = b.nodes[1] if b.nodes[0] == node else b.nodes[0]
+                    if depth[other.id] < 0:
+                        depth[other.id] = depth[node.id] + 1
+                        queue.append(other)
+
+        forest = DisjointSet(len(nodes))
+        tree: list[list[tuple[int, Branch]]] = [[] for _ in nodes]
+        chords: list[Branch] = []
+        for b in sorted(self.circuit.branches, key=lambda b: (priority(b), min(depth[b.nodes[0].id], depth[b.nodes[1].id]), b.id)):
+            u, v = b.nodes[0].id, b.nodes[1].id
+            if u == v:
+                continue
+            if forest.union(u, v):
+                tree[u].append((v, b))
+                tree[v].append((u, b))
+            else:
+                chords.append(b)
+
+        # Root every tree of the forest: up[k] is the branch to the parent of node k
+        depth = [-1] * len(nodes)
+        up: list[tuple[int, Branch] | None] = [None] * len(nodes)
+        for root in range(len(nodes)):
+            if depth[root] >= 0:
+                continue
+            depth[root] = 0
+            queue = deque([root])
+            while queue:
+                k = queue.popleft()
+                for other, b in tree[k]:
+                    if depth[other] < 0:
+                        depth[other] = depth[k] + 1
+                        up[other] = (k, b)
+                        queue.append(other)
+
+        for chord in chords:
+            u, v = chord.nodes[0].id, chord.nodes[1].id
+            # Climb from both ends to the lowest common ancestor
+            path_u, path_v = [], []
+            a, b = u, v
+            while a != b:
+                if depth[a] >= depth[b]:
+                    path_u.append(up[a])
+                    a = up[a][0] # type:ignore
+                else:
+                    path_v.append(up[b])
+                    b = up[b][0] # type:ignore
+
+            # u --chord--> v --up--> ancestor --down--> u
+            loop_nodes, loop_branches = [nodes[u]], [chord]
+            for k, b in path_v:
+                loop_nodes.append(b.nodes[0] if b.nodes[1].id == k else b.nodes[1])
+                loop_branches.append(b)
+            current = a
+            for k, b in reversed(path_u):
+                loop_nodes.append(nodes[current])
+                loop_branches.append(b)
+                current = b.nodes[0].id if b.nodes[1].id == current else b.nodes[1].id
+
+            loop = Loop(f"Loop {len(self.loops) + 1}", (loop_nodes, loop_branches))
+            [ b.loops.append(loop) for b in loop.branches ]
+            self.loops.append(loop)
+
+        self.n = len(self.loops)
+        return self.loops
+
     def super_loop_eq(self, current_source:'Branch') -> Equation:
         """
         Creates an equation for a super loop, which is a loop that contains multiple loops
@@ -95,13 +223,15 @@ class LoopAnalyzer:
     
     def get_resistance_matrix(self) -> tuple[list[Equation], list[Equation]]:
         """
-        Returns the resistance matrix and Tension vector for mesh analysis
+        Returns the mesh equations, one per loop (or super loop), and the auxiliary equations of the
+        sources inside loops. See get_system for the numeric (R, V) form.
         Returns:
-            tuple[np.ndarray, np.ndarray]: (R, V) where R is the resistance matrix and V is the Tension vector
+            tuple[list[Equation], list[Equation]]: (equations, auxiliary equations)
         """
         if not self.loops:
             self.find_loops()
 
+        self.super_loops = []
         equations = []
         aux_eqs = []
         solved_loops = {}
@@ -197,11 +327,99 @@ class LoopAnalyzer:
             if loop not in loops_in_super_loops:
                 equations.append(eq)
 
-        for i, eq1 in enumerate(equations[:]):
-            for j, eq2 in enumerate(equations[:]):
-                if i != j:
-                    if eq1.equal(eq2):
-                        equations.remove(eq2)
-                        break
+        return unique_equations(equations), aux_eqs
 
-        return equations, aux_eqs
+    def get_system(self) -> LinearSystem:
+        """
+        Numeric form of the mesh equations, R x = V, where x holds the loop currents and the auxiliary
+        variables of the sources. R is self.system.to_dense() or self.system.to_csc(), V is self.system.rhs.
+        """
+        if not self.loops:
+            self.find_loops()
+        with phase('mesh_equations'):
+            equations, aux_eqs = self.get_resistance_matrix()
+        with phase('assemble'):
+            self.system = LinearSystem(equations + aux_eqs)
+            annotate(**self.system.stats())
+        return self.system
+
+    def get_incidence_matrix(self):
+        """
+        Incidence of the loops in the branches, shape (branches, loops): +1 where the loop goes through
+        the branch from nodes[0] to nodes[1], -1 the other way around. Sparse if scipy is installed.
+        """
+        if not self.loops:
+            self.find_loops()
+        rows, cols, data = [], [], []
+        for k, loop in enumerate(self.loops):
+            for node, branch in zip(loop.nodes, loop.branches):
+                rows.append(branch.id)
+                cols.append(k)
+                data.append(1.0 if node == branch.nodes[0] else -1.0)
+        shape = (len(self.circuit.branches), len(self.loops))
+        if sparse is not None:
+            return sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        matrix = np.zeros(shape)
+        np.add.at(matrix, (rows, cols), data)
+        return matrix
+
+    def solve(self, backend: str = 'auto') -> dict[Branch, float]:
+        """
+        Solves the circuit by mesh analysis and writes the node voltages and the currents of the tension sources
+        back, like Circuit.solve (see write_node_voltages).
+        Args:
+            backend (str): 'dense', 'sparse' or 'auto', see LinearSystem.solve
+        Returns:
+            dict[Branch, float]: The current of every branch, from nodes[0] to nodes[1] through the branch
+        """
+        with phase('LoopAnalyzer.solve'):
+            system = self.get_system()
+            if system.shape[0] != system.shape[1]:
+                raise Exception(f"The mesh equations are not square: {system.shape[0]} equations for {system.shape[1]} variables.")
+            solution = system.solve(backend) if system.shape[1] else np.zeros(0)
+
+            with phase('branch_currents'):
+                loop_currents = np.zeros(len(self.loops))
+                position = {loop: k for k, loop in enumerate(self.loops)}
+                for var, value in zip(system.variables, solution):
+                    if (k := position.get(var)) is not None:
+                        loop_currents[k] = value
+                self.loop_currents = loop_currents
+                currents = self.get_incidence_matrix() @ loop_currents
+
+            with phase('write_back'):
+                for b in self.circuit.branches:
+                    if isinstance(b, TensionSource):
+                        b.i = -currents[b.id]
+                self.write_node_voltages(currents, dict(zip(system.variables, solution)))
+                self.circuit.mark_solved()
+            return dict(zip(self.circuit.branches, currents.tolist()))
+
+    def write_node_voltages(self, currents: np.ndarray, answer: dict) -> None:
+        """
+        Sets the voltage of every node reachable from the ground through resistors and tension sources,
+        from the branch currents and the solution of the mesh equations.
+        """
+        if (gnd := self.circuit.gnd) is None:
+            return
+        queue = deque([gnd])
+        reached = {gnd}
+        while queue:
+            node = queue.popleft()
+            for b in node.branches:
+                other = b.nodes[1] if b.nodes[0] == node else b.nodes[0]
+                if other in reached:
+                    continue
+                # Voltage of nodes[0] minus voltage of nodes[1]
+                if isinstance(b, Resistor):
+                    drop = b.r * currents[b.id]
+                elif isinstance(b, IndependentTensionSource):
+                    drop = -b.value
+                elif isinstance(b, TensionSource) and (b, b.n_minus) in answer:
+                    drop = -answer[(b, b.n_minus)]
+                else:
+                    continue
+                other.v = node.v - drop if node == b.nodes[0] else node.v + drop # type:ignore
+                other.solved = True
+                reached.add(other)
+                queue.append(other)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .SweepModel import SweepModel
+
+if TYPE_CHECKING:
+    from .Circuit import Circuit
+
+class Normal:
+    """Normal distribution; the mean defaults to the nominal value of the branch."""
+    def __init__(self, std: float, mean: float | None = None):
+        self.std = std
+        self.mean = mean
+
+    def sample(self, rng: np.random.Generator, size: int, nominal: float) -> np.ndarray:
+        return rng.normal(nominal if self.mean is None else self.mean, self.std, size)
+
+class Uniform:
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: np.random.Generator, size: int, nominal: float) -> np.ndarray:
+        return rng.uniform(self.low, self.high, size)
+
+class Tolerance:
+    """
+    Relative tolerance around the nominal value, e.g. Tolerance(0.05) for a 5% resistor.
+    'uniform' draws from nominal*(1 ± tolerance), 'normal' uses tolerance as three standard deviations.
+    """
+    def __init__(self, tolerance: float, kind: str = 'uniform'):
+        if kind not in ('uniform', 'normal'):
+            raise Exception(f"Unknown tolerance distribution: {kind}")
+        self.tolerance = tolerance
+        self.kind = kind
+
+    def sample(self, rng: np.random.Generator, size: int, nominal: float) -> np.ndarray:
+        if self.kind == 'normal':
+            return rng.normal(nominal, abs(nominal) * self.tolerance / 3, size)
+        return nominal * (1 + rng.uniform(-self.tolerance, self.tolerance, size))
+
+class RunningStatistics:
+    """
+    Count, mean, variance, extremes and a fixed-bin histogram of a group of quantities, updated chunk by chunk.
+    Chunks are merged with Chan's parallel update, so no sample is kept.
+    """
+    def __init__(self, edges: np.ndarray):
+        """
+        Args:
+            edges (np.ndarray): Histogram bin edges, shape (quantities, bins + 1)
+        """
+        self.edges = edges
+        quantities, bins = edges.shape[0], edges.shape[1] - 1
+        self.count = 0
+        self.mean = np.zeros(quantities)
+        self.m2 = np.zeros(quantities)
+        self.min = np.full(quantities, np.inf)
+        self.max = np.full(quantities, -np.inf)
+        self.histogram = np.zeros((quantities, bins), dtype=np.int64)
+        self.underflow = np.zeros(quantities, dtype=np.int64)
+        self.overflow = np.zeros(quantities, dtype=np.int64)
+
+    def add(self, samples: np.ndarray) -> None:
+        """Adds samples of shape (samples, quantities)."""
+        other = RunningStatistics(self.edges)
+        other.count = samples.shape[0]
+        other.mean = samples.mean(axis=0)
+        other.m2 = ((samples - other.mean)**2).sum(axis=0)
+        other.min = samples.min(axis=0)
+        other.max = samples.max(axis=0)
+        bins = self.edges.shape[1] - 1
+        for q in range(samples.shape[1]):
+            index = np.searchsorted(self.edges[q], samples[:, q], side='right') - 1
+            index[samples[:, q] == self.edges[q, -1]] = bins - 1
+            other.underflow[q] = np.count_nonzero(index < 0)
+            other.overflow[q] = np.count_nonzero(index >= bins)
+            other.histogram[q] = np.bincount(index[(index >= 0) & (index < bins)], minlength=bins)
+        self.merge(other)
+
+    def merge(self, other: RunningStatistics) -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.histogram += other.histogram
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / max(1, self.count - 1))
+
+    def percentiles(self, q: list[float]) -> np.ndarray:
+        """
+        Percentiles interpolated from the histogram, shape (quantities, len(q)).
+        Their resolution is one bin; samples outside the bins are placed at the observed extremes.
+        """
+        result = np.empty((self.edges.shape[0], len(q)))
+        for k in range(self.edges.shape[0]):
+            counts = np.concatenate([[self.underflow[k]], self.histogram[k], [self.overflow[k]]])
+            edges = np.concatenate([[min(self.min[k], self.edges[k, 0])], self.edges[k], [max(self.max[k], self.edges[k, -1])]])
+            cumulative = np.concatenate([[0], np.cumsum(counts)]) / max(1, self.count)
+            result[k] = np.clip(np.interp(np.asarray(q) / 100, cumulative, edges), self.min[k], self.max[k])
+        return result
+
+class MonteCarlo:
+    """
+    Monte Carlo tolerance analysis of a circuit.
+    Branch values are drawn from per-branch distributions in vectorized chunks, each chunk is solved
+    with one batched solve (see SweepModel), optionally in a process pool, and only running statistics
+    of every node voltage and branch current are kept.
+    Every chunk has its own seed spawned from the main seed, so results don't depend on the number of workers.
+    """
+    def __init__(self, circuit: Circuit, distributions: dict[str, Normal | Uniform | Tolerance | Callable],
+                 seed: int | None = None, chunk_size: int = 10000, bins: int = 50):
+        """
+        Args:
+            circuit (Circuit): The circuit, at its nominal values
+            distributions (dict): Branch name -> distribution, an object with sample(rng, size, nominal) or a
+                                  function f(rng, size, nominal). It must be picklable when using workers.
+            seed (int | None): Seed of the whole analysis
+            chunk_size (int): Samples drawn and solved together
+            bins (int): Histogram bins per quantity
+        """
+        self.circuit = circuit
+        self.names = list(distributions)
+        self.distributions = list(distributions.values())
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.bins = bins
+        self.model = SweepModel(circuit.prepare('dense'), self.names)
+        self.nominal = [circuit.get_branch(name).value for name in self.names] # type:ignore
+        self.voltages: RunningStatistics | None = None
+        self.currents: RunningStatistics | None = None
+
+    def run(self, samples: int, workers: int | None = None) -> dict:
+        """
+        Args:
+            samples (int): Number of samples
+            workers (int | None): Processes of the pool; the chunks are solved in this process if None or 0
+        Returns:
+            dict: The summary, see summary()
+        """
+        if samples < 1:
+            raise Exception(f"The number of samples must be at least 1, {samples} given.")
+        sizes = [min(self.chunk_size, samples - start) for start in range(0, samples, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        task = (self.model, self.distributions, self.nominal)
+
+        # The first chunk fixes the histogram ranges; later samples outside them are counted in underflow and overflow
+        voltages, currents = _run_chunk(task, seeds[0], sizes[0])
+        self.voltages = RunningStatistics(_edges(voltages, self.bins))
+        self.currents = RunningStatistics(_edges(currents, self.bins))
+        self.voltages.add(voltages)
+        self.currents.add(currents)
+
+        if workers:
+            # The model is sent once per worker; chunks are submitted a few at a time to bound memory
+            with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_task, initargs=(task,)) as executor:
+                pending = deque()
+                for seed, size in zip(seeds[1:], sizes[1:]):
+                    pending.append(executor.submit(_run_chunk, None, seed, size))
+                    if len(pending) >= 2 * workers:
+                        self._add(*pending.popleft().result())
+                while pending:
+                    self._add(*pending.popleft().result())
+        else:
+            for seed, size in zip(seeds[1:], sizes[1:]):
+                self._add(*_run_chunk(task, seed, size))
+
+        return self.summary()
+
+    def _add(self, voltages: np.ndarray, currents: np.ndarray) -> None:
+        self.voltages.add(voltages) # type:ignore
+        self.currents.add(currents) # type:ignore
+
+    def summary(self, percentiles: list[float] = [1, 5, 50, 95, 99]) -> dict:
+        """
+        Returns:
+            dict: {'samples': n, 'voltages': {node name: stats}, 'currents': {branch name: stats}}, where stats has
+                  mean, std, min, max, percentiles ({q: value}), histogram ((counts, edges)) and underflow and
+                  overflow, the samples below and above the histogram edges, fixed by the first chunk.
+                  Branch currents are signed, from nodes[0] to nodes[1] through the branch.
+        """
+        result = {'samples': self.voltages.count if self.voltages else 0, 'voltages': {}, 'currents': {}}
+        for key, stats, names in (('voltages', self.voltages, self.model.node_names), ('currents', self.currents, self.model.branch_names)):
+            if stats is None:
+                continue
+            values = stats.percentiles(percentiles)
+            for k, name in enumerate(names):
+                result[key][name] = {
+                    'mean': stats.mean[k],
+                    'std': stats.std[k],
+                    'min': stats.min[k],
+                    'max': stats.max[k],
+                    'percentiles': dict(zip(percentiles, values[k])),
+                    'histogram': (stats.histogram[k].copy(), stats.edges[k].copy()),
+                    'underflow': int(stats.underflow[k]),
+                    'overflow': int(stats.overflow[k]),
+                }
+        return result
+
+def _edges(samples: np.ndarray, bins: int) -> np.ndarray:
+    low, high = samples.min(axis=0), samples.max(axis=0)
+    margin = np.maximum((high - low) * 0.25, np.maximum(np.abs(low), np.abs(high)) * 1e-9 + 1e-12)
+    return np.linspace(low - margin, high + margin, bins + 1, axis=1)
+
+_worker_task: tuple | None = None
+
+def _set_worker_task(task: tuple) -> None:
+    global _worker_task
+    _worker_task = task
+
+def _run_chunk(task: tuple | None, seed: np.random.SeedSequence, size: int) -> tuple[np.ndarray, np.ndarray]:
+    model, distributions, nominal = task or _worker_task # type:ignore
+    rng = np.random.default_rng(seed)
+    values = [d.sample(rng, size, n) if hasattr(d, 'sample') else d(rng, size, n) for d, n in zip(distributions, nominal)]
+    solution = model.solve(values)
+    return solution[:, model.node_cols], model.branch_currents(solution, values)
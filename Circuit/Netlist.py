@@ -0,0 +1,235 @@
+"""
+SPICE-like netlists, one element per line:
+
+    * comment
+    R<name> n1 n2 resistance
+    V<name> n+ n- [DC] value            tension source, v(n+) - v(n-) = value
+    I<name> n+ n- [DC] value            current source, from n+ to n- through the source
+    E<name> n+ n- nc+ nc- gain          tension controlled tension source
+    G<name> n+ n- nc+ nc- transconductance
+    F<name> n+ n- control gain          current controlled current source
+    H<name> n+ n- control transresistance
+    .end
+
+The controlling current of F and H cards is the current through the branch named control, leaving
+the first node of its card. Any branch can control, not only V cards, and it may appear later in the file.
+Values take the SPICE suffixes (k, meg, m, u, n, ...). Lines starting with + continue the previous line,
+anything after ; is a comment and other dot commands are ignored. The ground is the node 0 (or gnd).
+"""
+from __future__ import annotations
+import os
+import re
+from typing import Iterable, Iterator, TextIO
+from .Circuit import Circuit
+from .Node import Node
+from .Branch import Branch, Resistor, IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource, \
+                    TensionSource, IndependentTensionSource, CurrentDependentTensionSource, TensionDependentTensionSource
+
+GROUND_NAMES = ('0', 'gnd')
+
+SUFFIXES = {'t': 1e12, 'g': 1e9, 'meg': 1e6, 'k': 1e3, 'mil': 25.4e-6, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12, 'f': 1e-15}
+
+NUMBER = re.compile(r'([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)([a-zA-Z]*)$')
+
+# Nodes of each card before its value (or its control branch, for F and H)
+CARD_NODES = {'R': 2, 'V': 2, 'I': 2, 'E': 4, 'G': 4, 'F': 2, 'H': 2}
+
+class Card:
+    """One element of a netlist."""
+    __slots__ = ('kind', 'name', 'nodes', 'value', 'control', 'line')
+
+    def __init__(self, kind: str, name: str, nodes: list[str], value: float, control: str | None = None, line: int = 0):
+        self.kind = kind
+        self.name = name
+        self.nodes = nodes
+        self.value = value
+        self.control = control
+        self.line = line
+
+def parse_value(text: str) -> float:
+    """Parses a number with an optional SPICE suffix, e.g. 4.7k or 10meg. Letters after the suffix are ignored."""
+    if (match := NUMBER.match(text)) is None:
+        raise ValueError(f"Invalid value: {text}")
+    number, suffix = match.groups()
+    suffix = suffix.lower()
+    for name in ('meg', 'mil'):
+        if suffix.startswith(name):
+            return float(number) * SUFFIXES[name]
+    return float(number) * SUFFIXES.get(suffix[:1], 1)
+
+def _lines(source: str | os.PathLike | Iterable[str]) -> Iterator[str]:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source) as file:
+            yield from file
+    else:
+        yield from source
+
+def read_netlist(source: str | os.PathLike | Iterable[str]) -> Iterator[Card]:
+    """
+    Parses a netlist line by line.
+    Args:
+        source: A file path or an iterable of lines, e.g. an open file
+    Returns:
+        Iterator[Card]: The cards, in the order of the file
+    """
+    pending: list[str] = []
+    pending_line = 0
+    for number, line in enumerate(_lines(source), start=1):
+        line = line.split(';', 1)[0].strip()
+        if not line or line.startswith('*'):
+            continue
+        if line.startswith('+'):
+            if not pending:
+                raise Exception(f"Netlist line {number}: continuation without a card.")
+            pending.extend(line[1:].split())
+            continue
+        if pending:
+            yield _parse_card(pending, pending_line)
+            pending = []
+        if line.startswith('.'):
+            if line.split()[0].lower() == '.end':
+                return
+            continue
+        pending = line.split()
+        pending_line = number
+    if pending:
+        yield _parse_card(pending, pending_line)
+
+def _parse_card(tokens: list[str], line: int) -> Card:
+    name = tokens[0]
+    kind = name[0].upper()
+    if (n_nodes := CARD_NODES.get(kind)) is None:
+        raise Exception(f"Netlist line {line}: unsupported element {name}.")
+    args = tokens[1:]
+    if kind in ('V', 'I') and len(args) > n_nodes and args[n_nodes].upper() == 'DC':
+        args = args[:n_nodes] + args[n_nodes + 1:]
+    expected = n_nodes + (2 if kind in ('F', 'H') else 1)
+    if len(args) != expected:
+        raise Exception(f"Netlist line {line}: {name} takes {expected} fields, got {len(args)}.")
+    try:
+        value = parse_value(args[-1])
+    except ValueError as e:
+        raise Exception(f"Netlist line {line}: {e}") from e
+    control = args[n_nodes] if kind in ('F', 'H') else None
+    return Card(kind, name, args[:n_nodes], value, control, line)
+
+def load_netlist(source: str | os.PathLike | Iterable[str], circuit: Circuit | None = None) -> Circuit:
+    """
+    Builds a circuit from a netlist (see read_netlist), adding to circuit if given.
+    Nodes are looked up by name; F and H cards wait only until their control branch exists.
+    Returns:
+        Circuit: The circuit
+    """
+    circuit = circuit if circuit is not None else Circuit()
+    waiting: dict[str, list[Card]] = {}
+
+    def node(name: str) -> Node:
+        if name.lower() in GROUND_NAMES:
+            return circuit.gnd if circuit.gnd is not None else Node(circuit, gnd=True)
+        if (n := circuit.node_index.get(name)) is None:
+            n = Node(circuit, name=name)
+        return n
+
+    def add(card: Card) -> None:
+        nodes = [node(name) for name in card.nodes]
+        if card.kind == 'R':
+            Resistor(card.value, nodes[0], nodes[1], name=card.name)
+        elif card.kind == 'V':
+            IndependentTensionSource(card.value, nodes[1], nodes[0], name=card.name)
+        elif card.kind == 'I':
+            IndependentCurrentSource(card.value, nodes[0], nodes[1], name=card.name)
+        elif card.kind == 'E':
+            TensionDependentTensionSource(card.value, nodes[1], nodes[0], nodes[2], nodes[3], name=card.name)
+        elif card.kind == 'G':
+            TensionDependentCurrentSource(card.value, nodes[0], nodes[1], nodes[2], nodes[3], name=card.name)
+        else:
+            control = circuit.get_branch(card.control) # type:ignore
+            if control is None:
+                waiting.setdefault(card.control, []).append(card) # type:ignore
+                return
+            out_of = card_nodes(control)[0]
+            if card.kind == 'F':
+                CurrentDependentCurrentSource(card.value, nodes[0], nodes[1], control, out_of, name=card.name)
+            else:
+                CurrentDependentTensionSource(card.value, nodes[1], nodes[0], control, out_of, name=card.name)
+
+        for dependent in waiting.pop(card.name, []):
+            add(dependent)
+
+    with circuit.bulk():
+        for card in read_netlist(source):
+            add(card)
+
+    if waiting:
+        card = next(iter(waiting.values()))[0]
+        raise Exception(f"Netlist line {card.line}: {card.name} is controlled by {card.control}, which is not in the netlist.")
+    return circuit
+
+def card_nodes(branch: Branch) -> list[Node]:
+    """The nodes of a branch in the order of its netlist card."""
+    if isinstance(branch, TensionSource):
+        return [branch.n_plus, branch.n_minus]
+    return list(branch.nodes)
+
+def write_netlist(circuit: Circuit, target: str | os.PathLike | TextIO) -> None:
+    """
+    Writes a circuit as a netlist that load_netlist reads back into an equivalent circuit.
+    Node and branch names are kept when they are valid and unique; branch names get the letter of their card in front if needed.
+    A current controlled source measuring the current out of the second node of its control card gets its gain negated.
+    Args:
+        target: A file path or an open text file
+    """
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'w') as file:
+            return write_netlist(circuit, file)
+
+    node_names: dict[Node, str] = {}
+    used: set[str] = set(GROUND_NAMES)
+    for n in circuit.nodes:
+        if n.gnd:
+            node_names[n] = '0'
+            continue
+        name = n.name if _valid_name(n.name) and n.name.lower() not in used else f"N{n.id}"
+        while name.lower() in used:
+            name = f"{name}_{n.id}"
+        used.add(name.lower())
+        node_names[n] = name
+
+    branch_names: dict[Branch, str] = {}
+    used = set()
+    for b in circuit.branches:
+        letter = _card_kind(b)
+        name = b.name if _valid_name(b.name) else str(b.id)
+        if name[0].upper() != letter:
+            name = letter + name
+        while name.lower() in used:
+            name = f"{name}_{b.id}"
+        used.add(name.lower())
+        branch_names[b] = name
+
+    target.write(f"* {len(circuit.nodes)} nodes, {len(circuit.branches)} branches\n")
+    for b in circuit.branches:
+        name = branch_names[b]
+        nodes = ' '.join(node_names[n] for n in card_nodes(b))
+        value = b.value
+        if isinstance(b, TensionDependentTensionSource):
+            nodes += f" {node_names[b.dep_n_plus]} {node_names[b.dep_n_minus]}"
+        elif isinstance(b, TensionDependentCurrentSource):
+            nodes += f" {node_names[b.v_plus]} {node_names[b.v_minus]}"
+        elif isinstance(b, (CurrentDependentCurrentSource, CurrentDependentTensionSource)):
+            nodes += f" {branch_names[b.branch_of_current]}"
+            if b.current_out_of != card_nodes(b.branch_of_current)[0]:
+                value = -value
+        target.write(f"{name} {nodes} {value:.17g}\n")
+    target.write(".end\n")
+
+def _card_kind(branch: Branch) -> str:
+    for kind, cls in (('R', Resistor), ('V', IndependentTensionSource), ('I', IndependentCurrentSource),
+                      ('E', TensionDependentTensionSource), ('G', TensionDependentCurrentSource),
+                      ('F', CurrentDependentCurrentSource), ('H', CurrentDependentTensionSource)):
+        if isinstance(branch, cls):
+            return kind
+    raise Exception(f"{type(branch).__name__} {branch.name} has no netlist card.")
+
+def _valid_name(name: str) -> bool:
+    return bool(name) and not any(c.isspace() or c == ';' for c in name) and name[0] not in '*+.'
@@ -1,82 +1,131 @@
-from Circuit import *
-from Equation import Equation
-import numpy as np
+from .Circuit import Circuit, Node, TensionSource, CurrentDependentTensionSource, TensionDependentTensionSource
+from .DisjointSet import DisjointSet
+from .Equation import Equation, unique_equations
+from .Instrumentation import phase, annotate
 
 class NodalAnalyzer:
     def __init__(self, circuit:Circuit):
         self.circuit = circuit
-        self.solved_nodes:set[Node] = {circuit['GND']} # type:ignore
-        self.map_solved_nodes(circuit['GND']) # type: ignore
+        self.solved_nodes:set[Node] = {circuit.gnd} if circuit.gnd is not None else set()
+        self.reduction = {'rows': 0, 'columns': 0}
+        self.map_solved_nodes(circuit.gnd) # type: ignore
 
     def map_solved_nodes(self, node:Node):
-        curr = node
-        if not curr:
+        """
+        Propagates the voltage of node through chains of independent tension sources, marking the nodes reached as solved.
+        """
+        if not node:
             return
-        for b in curr.branches:
-            if type(b).__name__ == 'IndependentTensionSource':
-                other = b.nodes[0] if b.nodes[0] != curr else b.nodes[1]
-                self.solved_nodes.add(other)  # type: ignore
-                if not other or other.solved:
-                    continue
-                other.solved = True
-                other.v = (curr.v + b.value) if other == b.nodes[1] else curr.v - b.value # type:ignore
-                self.map_solved_nodes(other)
+        stack = [node]
+        while stack:
+            curr = stack.pop()
+            for b in curr.branches:
+                if type(b).__name__ == 'IndependentTensionSource':
+                    other = b.nodes[0] if b.nodes[0] != curr else b.nodes[1]
+                    self.solved_nodes.add(other)
+                    if other.solved:
+                        continue
+                    other.solved = True
+                    other.v = (curr.v + b.value) if other == b.nodes[1] else curr.v - b.value # type:ignore
+                    stack.append(other)
+
+    def eliminate_solved_nodes(self, eqs:list[Equation]) -> list[Equation]:
+        """
+        Moves the terms of solved nodes to the constant of every equation, dropping the equations left without variables.
+        The equations given are left unchanged: the ones with solved nodes are replaced by copies.
+        """
+        result = []
+        for eq in eqs:
+            if any(type(var) == Node and var.solved for var in eq.variables):
+                eq = Equation(eq.dict)
+                for var in list(eq.variables):
+                    if type(var) == Node and var.solved:
+                        eq[None] += eq[var] * var.v
+                        eq[var] = 0
+            if any(var is not None for var in eq.variables):
+                result.append(eq)
+        return result
+
+    def find_super_nodes(self) -> dict[int, list[Node]]:
+        """
+        Groups the nodes joined by tension sources with a disjoint-set, in one pass over the branches.
+        Returns:
+            dict[int, list[Node]]: The nodes of every group of two or more nodes, keyed by the id of its representative
+        """
+        nodes = self.circuit.get_nodes()
+        groups = DisjointSet(len(nodes))
+        for b in self.circuit.branches:
+            if isinstance(b, TensionSource):
+                groups.union(b.n_plus.id, b.n_minus.id)
+
+        self.super_node_of: dict[Node, int] = {}
+        super_nodes: dict[int, list[Node]] = {}
+        for n in nodes:
+            super_nodes.setdefault(groups.find(n.id), []).append(n)
+        self.super_nodes = {root: group for root, group in super_nodes.items() if len(group) > 1}
+        for root, group in self.super_nodes.items():
+            for n in group:
+                self.super_node_of[n] = root
+        return self.super_nodes
 
     def make_super_node(self, tension_source) -> Equation:
+        """Sum of the KCL equations of the nodes joined to tension_source by tension sources."""
+        if not hasattr(self, 'super_nodes'):
+            self.find_super_nodes()
         eq: Equation = Equation()
-        nodes = [tension_source.n_plus, tension_source.n_minus]
-        passed = set()
-        while nodes:
-            #print(', '.join([a.name for a in nodes]))
-            n = nodes.pop()
-            if n in passed:
-                continue
-            passed.add(n)
-            for s in filter(lambda b: issubclass(type(b), TensionSource), n.branches):
-                if not s.n_plus in passed:
-                    nodes.append(s.n_plus) 
-                if not s.n_minus in passed:
-                    nodes.append(s.n_minus)
+        for n in self.super_nodes[self.super_node_of[tension_source.n_plus]]:
             eq += n.get_currents_eq()
         return eq
     
     def filter_equal_eqs(self, eqs:list[Equation]) -> list[Equation]:
-        new = list()
-        dicts = list()
-        for eq in eqs:
-            if not eq.dict in dicts:
-                dicts.append(eq.dict)
-                new.append(eq)
-        return new
+        return unique_equations(eqs)
 
     def get_conductances_matrix(self) -> tuple[list[Equation], list[Equation]]:
-        nodes_eqs = self.circuit.get_nodal_eqs()
-        aux_eqs = self.circuit.get_aux_eqs()
+        """
+        Nodal equations: the KCL equation of every unsolved node outside a super node, one KCL equation per
+        super node without a solved node, and the constraint of every controlled tension source.
+        Solved nodes (see map_solved_nodes) are not unknowns: their voltages are folded into the constants,
+        and self.reduction counts the rows and columns saved this way.
+        Returns:
+            tuple[list[Equation], list[Equation]]: (equations, auxiliary equations)
+        """
+        with phase('NodalAnalyzer.get_conductances_matrix'):
+            with phase('super_nodes'):
+                self.find_super_nodes()
+                annotate(super_nodes=len(self.super_nodes))
+            with phase('equations'):
+                aux_eqs = self.circuit.get_aux_eqs()
+
+                nodes_eqs: list[Equation] = []
+                super_node_eqs: dict[int, Equation] = {}
+                for n in self.circuit.get_nodes():
+                    if n.solved:
+                        continue
+                    if (root := self.super_node_of.get(n)) is None:
+                        nodes_eqs.append(n.get_currents_eq())
+                    elif not any(m.solved for m in self.super_nodes[root]):
+                        # The tension source currents inside the group cancel out in the sum
+                        eq = n.get_currents_eq()
+                        super_node_eqs[root] = super_node_eqs[root] + eq if root in super_node_eqs else eq
+                nodes_eqs += super_node_eqs.values()
 
-        for e in nodes_eqs.copy():
-            for var in e.dict.copy():
-                if type(var).__name__ in ("Node", "NoneType"):
-                    continue
-                elif type(var[0]).__name__ == 'IndependentTensionSource':
-                    if e in nodes_eqs:
-                        nodes_eqs.remove(e)
-                    if not (var[0].n_plus.solved or var[0].n_minus.solved):
-                        nodes_eqs.append(self.make_super_node(var[0]))
-                elif type(var[0]).__name__ in ('CurrentDependentTensionSource' ,'TensionDependentTensionSource'):
-                    if e in nodes_eqs:
-                        nodes_eqs.remove(e)
-                    if not (var[0].n_minus.solved or var[0].n_plus.solved):
-                        nodes_eqs.append(self.make_super_node(var[0]))
-                    nodes_eqs.append(Equation( { var[0].n_plus:1, var[0].n_minus:-1, var: -1 } ))
+                for b in self.circuit.branches:
+                    if isinstance(b, (CurrentDependentTensionSource, TensionDependentTensionSource)) and not (b.n_plus.solved and b.n_minus.solved):
+                        nodes_eqs.append(Equation({ b.n_plus:1, b.n_minus:-1, (b, b.nodes[0]): -1 }))
 
-        for e in nodes_eqs:
-            e[self.circuit["GND"]] = 0
-            if not set(e.variables):
-                nodes_eqs.remove(e)
-        
-        for n in self.solved_nodes:
-            if n.name == 'GND':
-                continue
-            nodes_eqs.append(Equation({n:1, None:-n.v})) # type:ignore
+            with phase('eliminate_solved_nodes'):
+                # Known voltages go to the right-hand side instead of staying unknowns with an identity row each
+                solved = {var for e in nodes_eqs + aux_eqs for var in e.variables if type(var) == Node and var.solved and not var.gnd}
+                n_eqs = len(nodes_eqs) + len(aux_eqs)
+                nodes_eqs = self.eliminate_solved_nodes(nodes_eqs)
+                aux_eqs = self.eliminate_solved_nodes(aux_eqs)
+                self.reduction = {
+                    'rows': len([n for n in self.solved_nodes if not n.gnd]) + n_eqs - len(nodes_eqs) - len(aux_eqs),
+                    'columns': len(solved),
+                }
+                annotate(**self.reduction)
 
-        return self.filter_equal_eqs(nodes_eqs), self.filter_equal_eqs(aux_eqs)
+            with phase('deduplicate'):
+                unique_nodes_eqs, unique_aux_eqs = self.filter_equal_eqs(nodes_eqs), self.filter_equal_eqs(aux_eqs)
+                annotate(dropped=len(nodes_eqs) + len(aux_eqs) - len(unique_nodes_eqs) - len(unique_aux_eqs))
+            return unique_nodes_eqs, unique_aux_eqs
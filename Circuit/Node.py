@@ -1,10 +1,11 @@
 from __future__ import annotations
 from .Branch import Branch, TensionSource
-from .Equation import Equation
+from .Equation import Equation, SparseRow, VariableIndex
 
 class Node:
     def __init__(self, circuit, v:float|None=None, gnd:bool=False, name:str = ''):
         self.circuit = circuit
+        self.id: int = -1
 
         self.v = v
         self.branches : list[Branch] = []
@@ -32,6 +33,11 @@ class Node:
                     eq[n] += condutances[n]
         return eq
     
+    def get_currents_row(self, ids: VariableIndex) -> SparseRow:
+        """get_currents_eq as a SparseRow; the terms of the branches are concatenated, not merged."""
+        rows = [row for branch in self.branches if (row := branch.get_current_row(self, ids)) is not None]
+        return SparseRow.concatenate(rows)
+
     def get_aux_eqs(self) -> list[Equation]:
         return [b.get_aux_eq() for b in self.branches if b.get_aux_eq() is not None] # type:ignore
     
@@ -0,0 +1,54 @@
+"""
+Fill-reducing variable orderings for the sparse LU factorization of the circuit matrices:
+
+    mmd      multiple minimum degree on the pattern of A + A^T (SuperLU's MMD_AT_PLUS_A), the least fill on
+             nodal matrices, which are nearly symmetric
+    colamd   column approximate minimum degree, SuperLU's own default
+    rcm      reverse Cuthill-McKee on the pattern of A + A^T: a small bandwidth, cheap to compute
+    natural  the variable order (nodes by id, then branch currents)
+
+An order is computed by the first factorization and can be reused for every matrix with the same pattern
+(see Factorization col_order and Circuit.solve).
+"""
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.sparse import csgraph
+except ImportError: # orderings only apply to the sparse backend
+    sparse = None
+    csgraph = None
+
+ORDERINGS = ('mmd', 'colamd', 'rcm', 'natural')
+
+# SuperLU permc_spec of the orderings it computes itself
+PERMC_SPEC = {'mmd': 'MMD_AT_PLUS_A', 'colamd': 'COLAMD', 'natural': 'NATURAL'}
+
+def symmetric_pattern(matrix):
+    """Pattern of A + A^T as a csr matrix of ones."""
+    pattern = sparse.csr_matrix((np.ones(matrix.nnz), matrix.nonzero()), shape=matrix.shape)
+    return (pattern + pattern.T).tocsr()
+
+def rcm_order(matrix) -> np.ndarray:
+    """Reverse Cuthill-McKee order of the pattern of A + A^T."""
+    return np.asarray(csgraph.reverse_cuthill_mckee(symmetric_pattern(matrix), symmetric_mode=True), dtype=np.int64)
+
+def check_ordering(ordering: str) -> str:
+    if ordering not in ORDERINGS:
+        raise Exception(f"Unknown ordering: {ordering}, expected one of {', '.join(ORDERINGS)}")
+    return ordering
+
+def bandwidth_profile(matrix, order: np.ndarray | None = None) -> dict[str, int]:
+    """
+    Bandwidth (largest |i - j| of a non-zero) and profile (sum over the rows of the distance from the first non-zero
+    to the diagonal, the fill bound of a banded factorization) of A + A^T with rows and columns in the given order.
+    """
+    pattern = symmetric_pattern(matrix).tocoo()
+    position = np.arange(matrix.shape[0]) if order is None else np.argsort(order)
+    rows, cols = position[pattern.row], position[pattern.col]
+    if not len(rows):
+        return {'bandwidth': 0, 'profile': 0}
+    first = np.full(matrix.shape[0], matrix.shape[0], dtype=np.int64)
+    np.minimum.at(first, rows, cols)
+    n = np.arange(matrix.shape[0])
+    return {'bandwidth': int(np.abs(rows - cols).max()), 'profile': int(np.maximum(n - first, 0).sum())}
@@ -0,0 +1,59 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from collections import deque
+
+if TYPE_CHECKING:
+    from .Circuit import Circuit
+    from .Node import Node
+    from .Branch import Branch
+
+class PathTree:
+    """
+    Breadth-first spanning forest of a circuit with parent pointers, giving a path between any two
+    connected nodes from a single traversal. Only branches with a tension equation are used.
+    Built by Circuit.get_path and kept until the topology of the circuit changes.
+    """
+    def __init__(self, circuit: Circuit):
+        self.version = circuit.topology_version
+        self.parent: list[tuple[Node, Branch] | None] = [None] * len(circuit.nodes)
+        self.depth: list[int] = [-1] * len(circuit.nodes)
+        self.root: list[int] = [-1] * len(circuit.nodes)
+
+        starts = ([circuit.gnd] if circuit.gnd is not None else []) + circuit.nodes
+        for start in starts:
+            if self.depth[start.id] >= 0:
+                continue
+            self.depth[start.id] = 0
+            self.root[start.id] = start.id
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for b in node.branches:
+                    other = b.nodes[1] if b.nodes[0] == node else b.nodes[0]
+                    if self.depth[other.id] >= 0 or b.get_tension_eq(node) is None:
+                        continue
+                    self.depth[other.id] = self.depth[node.id] + 1
+                    self.root[other.id] = start.id
+                    self.parent[other.id] = (node, b)
+                    queue.append(other)
+
+    def path(self, from_node: Node, to_node: Node) -> list[tuple[Branch, Node]] | None:
+        """
+        Returns:
+            list[tuple[Branch, Node]] | None: The branches from from_node to to_node, each with the node it is
+                                             traversed from, or None if the nodes are not connected
+        """
+        if self.root[from_node.id] != self.root[to_node.id]:
+            return None
+        up, down = [], []
+        a, b = from_node, to_node
+        while a != b:
+            if self.depth[a.id] >= self.depth[b.id]:
+                parent, branch = self.parent[a.id] # type:ignore
+                up.append((branch, a))
+                a = parent
+            else:
+                parent, branch = self.parent[b.id] # type:ignore
+                down.append((branch, parent))
+                b = parent
+        return up + down[::-1]
@@ -0,0 +1,415 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import numpy as np
+from .Equation import Equation
+from .LinearSystem import LinearSystem, Factorization, choose_backend, sparse
+from .SweepModel import SweepModel, stamp_parameter, parameter_value
+from .Branch import Resistor, IndependentCurrentSource, IndependentTensionSource, CurrentDependentCurrentSource, \
+                    TensionDependentCurrentSource, CurrentDependentTensionSource, TensionDependentTensionSource, TensionSource
+from .Node import Node
+
+if TYPE_CHECKING:
+    from .Circuit import Circuit
+    from .Branch import Branch
+
+class PreparedCircuit:
+    """
+    Nodal system of a circuit analysed once for repeated solves where only branch values change.
+    The variable order, the sparsity pattern and the column order of the LU factorization are kept;
+    changing values only recomputes the rows that depend on the changed branches.
+    """
+    def __init__(self, circuit: Circuit, backend: str = 'auto'):
+        self.circuit = circuit
+        self.gnd = circuit.gnd
+        self.grounds = [n for n in circuit.nodes if n.gnd]
+
+        # Row sources: the KCL equation of every node but the ground, then the auxiliary equation of every branch
+        sources: list[tuple[str, object]] = [('node', n) for n in circuit.nodes if not n.gnd]
+        sources += [('branch', b) for b in circuit.branches if b.get_aux_eq() is not None and not all(n.gnd for n in b.nodes)]
+
+        # A zero gain drops its entries from the equations: the pattern is built with such gains set to 1,
+        # so that a later non-zero gain fits it, and the actual values are stamped below
+        dependent = (CurrentDependentCurrentSource, TensionDependentCurrentSource, CurrentDependentTensionSource, TensionDependentTensionSource)
+        probed = [b for b in circuit.branches if isinstance(b, dependent) and b.value == 0]
+        for b in probed:
+            b.set_value(1)
+        try:
+            eqs = [self.row_eq(source) for source in sources]
+        finally:
+            for b in probed:
+                b.set_value(0)
+        self.system = LinearSystem(eqs, n_nodes=len(circuit.nodes))
+        self.sources = [sources[k] for k in self.system.kept]
+
+        self.variables = self.system.variables
+        self.index = self.system.index
+        self.shape = self.system.shape
+        self.backend = choose_backend(backend, self.shape[1])
+
+        # Position of every (row, variable) of the pattern in the data array
+        self.slots: list[dict] = [dict() for _ in self.sources]
+        for k, (row, col) in enumerate(zip(self.system.rows, self.system.cols)):
+            self.slots[row][self.variables[col]] = k
+
+        # Rows to recompute when a branch value changes
+        rows_of_node = {source.id: row for row, (kind, source) in enumerate(self.sources) if kind == 'node'} # type:ignore
+        self.rows_of_branch: dict[int, set[int]] = {}
+        for row, (kind, source) in enumerate(self.sources):
+            if kind == 'node':
+                continue
+            self.rows_of_branch.setdefault(source.id, set()).add(row) # type:ignore
+            if (controller := getattr(source, 'branch_of_current', None)) is not None:
+                self.rows_of_branch.setdefault(controller.id, set()).add(row)
+        for b in circuit.branches:
+            rows = self.rows_of_branch.setdefault(b.id, set())
+            rows.update(rows_of_node[n.id] for n in b.nodes if n.id in rows_of_node)
+
+        self.data = self.system.data.copy()
+        self.rhs = self.system.rhs.copy()
+        self.values = {b.id: b.stamp_key() for b in circuit.branches}
+        if probed:
+            self.restamp(set().union(*(self.rows_of_branch[b.id] for b in probed)))
+        self.col_order: np.ndarray | None = None
+        self.factorization: Factorization | None = None
+
+    def row_eq(self, source: tuple[str, object]) -> Equation:
+        kind, obj = source
+        eq: Equation = obj.get_currents_eq() if kind == 'node' else obj.get_aux_eq() # type:ignore
+        for gnd in self.grounds:
+            if gnd in eq:
+                eq[gnd] = 0
+        return eq
+
+    def restamp(self, rows) -> None:
+        """Recomputes the coefficients and right-hand side of the given rows from the current branch values."""
+        for row in rows:
+            slots = self.slots[row]
+            self.data[list(slots.values())] = 0
+            self.rhs[row] = 0
+            for var, coef in self.row_eq(self.sources[row]).dict.items():
+                if var is None:
+                    self.rhs[row] = -coef
+                elif coef != 0:
+                    if (k := slots.get(var)) is None:
+                        raise Exception("The circuit topology changed, prepare it again.")
+                    self.data[k] = coef
+        self.factorization = None
+
+    def __getitem__(self, name: str) -> float:
+        return self.branch(name).value
+
+    def __setitem__(self, name: str, value: float) -> None:
+        self.branch(name).set_value(value)
+
+    def branch(self, name: str) -> Branch:
+        if (b := self.circuit.get_branch(name)) is None:
+            raise Exception(f"There is no branch named {name}.")
+        return b
+
+    def update(self, values: dict[str, float] | None = None) -> None:
+        """
+        Sets branch values by name and restamps the rows of every branch whose value changed (see Branch.stamp_key),
+        including branches changed directly through set_value.
+        """
+        for name, value in (values or {}).items():
+            self[name] = value
+
+        if len(self.circuit.branches) != len(self.values):
+            raise Exception("The circuit topology changed, prepare it again.")
+        rows = set()
+        for b in self.circuit.branches:
+            if (key := b.stamp_key()) != self.values[b.id]:
+                rows.update(self.rows_of_branch[b.id])
+                self.values[b.id] = key
+        if rows:
+            self.restamp(rows)
+
+    def matrix(self):
+        if self.backend == 'dense':
+            matrix = np.zeros(self.shape)
+            matrix[self.system.rows, self.system.cols] = self.data
+            return matrix
+        return sparse.csc_matrix((self.data, (self.system.rows, self.system.cols)), shape=self.shape)
+
+    def factorize(self) -> Factorization:
+        """LU factors of the current values, refactored only after a change. The column order of the first factorization is reused."""
+        self.update()
+        if self.factorization is None:
+            self.factorization = Factorization(self.matrix(), self.col_order)
+            self.col_order = self.factorization.col_order
+        return self.factorization
+
+    def solve(self, values: dict[str, float] | None = None) -> dict:
+        """
+        Solves the circuit with the current (or the given) branch values and writes the solution back like Circuit.solve.
+        Returns:
+            dict: The value of every variable, keyed by Node or (TensionSource, Node)
+        """
+        self.update(values)
+        solution = self.factorize().solve(self.rhs)
+        return self.circuit.write_back(self.variables, solution)
+
+    def solve_many(self, rhs: np.ndarray) -> np.ndarray:
+        """
+        Solves the system for many right-hand sides with a single factorization. Nothing is written back.
+        Args:
+            rhs (np.ndarray): shape (rows, k), one right-hand side per column, rows ordered as self.sources
+        Returns:
+            np.ndarray: shape (variables, k), rows ordered as self.variables
+        """
+        return self.factorize().solve(np.asarray(rhs, dtype=float))
+
+    def node_voltages(self, solution: np.ndarray) -> np.ndarray:
+        """
+        Rows of the node voltages in a solution of solve_many, shape (nodes, k) indexed by Node.id:
+        zero for the ground nodes, NaN for a node outside the system.
+        """
+        voltages = np.full((len(self.circuit.nodes), solution.shape[1]), np.nan)
+        voltages[[n.id for n in self.grounds]] = 0
+        nodes = [(var.id, col) for col, var in enumerate(self.variables) if not isinstance(var, tuple)]
+        if nodes:
+            ids, cols = map(list, zip(*nodes))
+            voltages[ids] = solution[cols]
+        return voltages
+
+    def row_constant(self, row: int) -> float:
+        """Right-hand side of a row for the current branch values, without restamping."""
+        return -self.row_eq(self.sources[row]).dict.get(None, 0)
+
+    def source_columns(self, sources: list[Branch]) -> np.ndarray:
+        """
+        Right-hand side of every independent source alone, at its value, one column each: the right-hand side
+        of the circuit is linear in the source values, so the columns add up to self.rhs.
+        """
+        self.update()
+        columns = np.zeros((self.shape[0], len(sources)))
+        for k, b in enumerate(sources):
+            if not isinstance(b, (IndependentCurrentSource, IndependentTensionSource)):
+                raise Exception(f"{b.name} is not an independent source.")
+            rows = sorted(self.rows_of_branch[b.id])
+            value = b.value
+            b.set_value(0)
+            try:
+                columns[rows, k] = self.rhs[rows] - np.array([self.row_constant(row) for row in rows])
+            finally:
+                b.set_value(value)
+        return columns
+
+    def superposition(self, sources: list[Branch | str] | None = None) -> tuple[list[Branch], np.ndarray]:
+        """
+        Contribution of every independent source to every node voltage, from one factorization.
+        With all the independent sources, the columns add up to the solution of the circuit.
+        Args:
+            sources (list[Branch | str] | None): Sources (or their names); every independent source if None
+        Returns:
+            tuple[list[Branch], np.ndarray]: (the sources, contributions of shape (nodes, sources) indexed by Node.id)
+        """
+        if sources is None:
+            sources = [b for b in self.circuit.branches if isinstance(b, (IndependentCurrentSource, IndependentTensionSource))]
+        sources = [self.branch(b) if isinstance(b, str) else b for b in sources]
+        return sources, self.node_voltages(self.solve_many(self.source_columns(sources))) # type:ignore
+
+    def excitation_response(self, injections: np.ndarray) -> np.ndarray:
+        """
+        Node voltages caused by user given excitations alone (the circuit sources turned off), with one factorization.
+        Args:
+            injections (np.ndarray): shape (nodes, k) indexed by Node.id, current injected into every node from the ground
+                                     by each excitation
+        Returns:
+            np.ndarray: Node voltages, shape (nodes, k) indexed by Node.id
+        """
+        injections = np.asarray(injections, dtype=float).reshape(len(self.circuit.nodes), -1)
+        rhs = np.zeros((self.shape[0], injections.shape[1]))
+        for row, (kind, source) in enumerate(self.sources):
+            if kind == 'node':
+                rhs[row] = injections[source.id] # type:ignore
+        return self.node_voltages(self.solve_many(rhs))
+
+    def thevenin(self, pairs: list[tuple]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Thevenin and Norton equivalents of the circuit seen from many node pairs, with one factorization:
+        the open circuit voltage is one solve, the resistance one unit current injection per pair, all at once.
+        Args:
+            pairs (list[tuple]): (a, b) terminal pairs, nodes or node names; b None is the ground
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Thevenin voltages v(a) - v(b), Thevenin resistances and
+                                                       Norton currents (from a to b through a short), one per pair
+        """
+        a = np.array([self.node(p[0]).id for p in pairs], dtype=np.int64)
+        b = np.array([self.node(p[1]).id for p in pairs], dtype=np.int64)
+        columns = np.arange(len(pairs))
+        injections = np.zeros((len(self.circuit.nodes), len(pairs)))
+        np.add.at(injections, (a, columns), 1)
+        np.add.at(injections, (b, columns), -1)
+
+        self.update()
+        voltages = self.node_voltages(self.solve_many(self.rhs[:, None]))[:, 0]
+        response = self.excitation_response(injections)
+        v_th = voltages[a] - voltages[b]
+        r_th = response[a, columns] - response[b, columns]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            i_n = v_th / r_th
+        return v_th, r_th, i_n
+
+    def node(self, node) -> Node:
+        """A node of the circuit, given itself, by name, or None for the ground."""
+        if node is None:
+            node = self.gnd
+        elif isinstance(node, str):
+            node = self.circuit[node]
+        if node is None:
+            raise Exception("There is no such node in the circuit.")
+        return node
+
+    def derivative(self, branch: Branch) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Derivative of the system with respect to the stamp parameter of a branch (see stamp_parameter).
+        Returns:
+            tuple: (positions in the data array, d data, rows, d rhs)
+        """
+        self.update()
+        return self.stamp_derivative(branch)
+
+    def stamp_derivative(self, branch: Branch) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """derivative without checking for changed values first, for loops over many branches after one update."""
+        rows = np.array(sorted(self.rows_of_branch[branch.id]), dtype=np.int64)
+        positions = np.array([k for row in rows for k in self.slots[row].values()], dtype=np.int64)
+
+        value = branch.value
+        p0 = stamp_parameter(branch, value)
+        step = p0 if p0 != 0 else 1
+        data0, rhs0 = self.data[positions], self.rhs[rows]
+        branch.set_value(parameter_value(branch, p0 + step))
+        try:
+            self.restamp(rows)
+            data1, rhs1 = self.data[positions], self.rhs[rows]
+        finally:
+            branch.set_value(value)
+            self.restamp(rows)
+        return positions, (data1 - data0) / step, rows, (rhs1 - rhs0) / step
+
+    def sensitivity(self, outputs) -> np.ndarray:
+        """
+        Derivatives of outputs with respect to the value of every branch by the adjoint method: one transposed solve
+        per output, shared by all the branches, instead of one solve per branch.
+        For A x = b and an output y = c x, dy/dp = λ (db/dp - dA/dp x) with A^T λ = c.
+        Args:
+            outputs: A node (its voltage), a branch (its current from nodes[0] to nodes[1]), a node or branch name,
+                     or a list of them
+        Returns:
+            np.ndarray: d output / d branch value indexed by Branch.id, shape (outputs, branches) for a list of outputs
+        """
+        single = not isinstance(outputs, (list, tuple))
+        outputs = [outputs] if single else list(outputs)
+        if self.shape[0] != self.shape[1]:
+            raise np.linalg.LinAlgError('Last 2 dimensions of the array must be square')
+
+        factorization = self.factorize()
+        x = factorization.solve(self.rhs)
+        weights = np.zeros((self.shape[1], len(outputs)))
+        result = np.zeros((len(outputs), len(self.circuit.branches)))
+        for k, output in enumerate(outputs):
+            self.output_weights(output, x, weights[:, k], result[k])
+        adjoint = factorization.solve(weights, transpose=True).reshape(self.shape[0], -1)
+
+        # Resistors and independent sources have stamps with known derivatives: their terms are computed at once.
+        # A row index of -1 (the ground) reads a zero row of the adjoint.
+        node_row = np.full(len(self.circuit.nodes), -1, dtype=np.int64)
+        branch_row = {}
+        for row, (kind, source) in enumerate(self.sources):
+            if kind == 'node':
+                node_row[source.id] = row # type:ignore
+            else:
+                branch_row[source.id] = row # type:ignore
+        has_row = (node_row >= 0) | np.array([n.gnd for n in self.circuit.nodes], dtype=bool)
+        adjoint = np.vstack([adjoint, np.zeros((1, adjoint.shape[1]))])
+        voltages = np.nan_to_num(self.node_voltages(x[:, None])[:, 0])
+
+        # A branch controlling a current dependent source also appears in the auxiliary row of the source
+        node_rows = set(node_row[node_row >= 0].tolist())
+        resistors, currents, general = [], [], []
+        for b in self.circuit.branches:
+            if isinstance(b, Resistor) and b.r == 0:
+                continue
+            if isinstance(b, (Resistor, IndependentCurrentSource)) and has_row[b.nodes[0].id] and has_row[b.nodes[1].id] \
+                    and self.rows_of_branch[b.id] <= node_rows:
+                (resistors if isinstance(b, Resistor) else currents).append(b)
+            elif isinstance(b, IndependentTensionSource) and b.id in branch_row:
+                # Its row is v+ - v- = value
+                result[:, b.id] += adjoint[branch_row[b.id]]
+            else:
+                general.append(b)
+        for group in (resistors, currents):
+            if not group:
+                continue
+            ids = np.array([b.id for b in group], dtype=np.int64)
+            n0 = np.array([b.nodes[0].id for b in group], dtype=np.int64)
+            n1 = np.array([b.nodes[1].id for b in group], dtype=np.int64)
+            d_adjoint = adjoint[node_row[n0]] - adjoint[node_row[n1]]
+            if group is resistors:
+                # g (v0 - v1) in the rows of nodes[0] and nodes[1]: dy/dR = -dy/dg / R^2 = (λ0 - λ1)(v0 - v1) / R^2
+                r = np.array([b.r for b in group])
+                result[:, ids] += (d_adjoint * ((voltages[n0] - voltages[n1]) / r ** 2)[:, None]).T
+            else:
+                # -I in the right-hand side of the row of nodes[0], I in the row of nodes[1]
+                result[:, ids] -= d_adjoint.T
+
+        for b in general:
+            positions, d_data, rows, d_rhs = self.stamp_derivative(b)
+            residual = d_rhs.copy()
+            np.add.at(residual, np.searchsorted(rows, self.system.rows[positions]), -d_data * x[self.system.cols[positions]])
+            # Chain rule from the stamp parameter (the conductance of a resistor) to the value
+            d_parameter = -1 / b.r ** 2 if isinstance(b, Resistor) else 1
+            result[:, b.id] += (adjoint[rows].T @ residual) * d_parameter
+        # The values were put back as they were, so the factorization still holds
+        self.factorization = factorization
+        return result[0] if single else result
+
+    def output_weights(self, output, x: np.ndarray, weights: np.ndarray, explicit: np.ndarray) -> None:
+        """
+        Writes an output as weights . x plus a part that depends on branch values only, whose derivative by the
+        value of every branch is added to explicit.
+        """
+        if isinstance(output, str):
+            output = self.circuit[output] or self.branch(output)
+
+        def add(var, weight):
+            if var is None or getattr(var, 'gnd', False):
+                return
+            if (col := self.index.get(var)) is None:
+                raise Exception(f"{getattr(var, 'name', var)} is not a variable of the circuit.")
+            weights[col] += weight
+
+        def voltage(node):
+            return 0 if node.gnd else x[self.index[node]]
+
+        if isinstance(output, Node):
+            add(output, 1)
+        elif isinstance(output, Resistor):
+            add(output.nodes[0], output.y)
+            add(output.nodes[1], -output.y)
+            explicit[output.id] -= (voltage(output.nodes[0]) - voltage(output.nodes[1])) / output.r ** 2
+        elif isinstance(output, TensionSource):
+            add((output, output.nodes[0]), -1)
+        elif isinstance(output, IndependentCurrentSource):
+            explicit[output.id] += 1
+        elif isinstance(output, (CurrentDependentCurrentSource, TensionDependentCurrentSource)):
+            add((output, output.nodes[0]), 1)
+        else:
+            raise Exception(f"The current of {output.name} can't be an output.")
+
+    def sweep(self, values: dict[str, np.ndarray], chunk_size: int | None = None) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        """
+        Solves the circuit for a batch of branch values at once, see SweepModel.
+        The branches keep their values and the circuit is not written back.
+        Args:
+            values (dict[str, np.ndarray]): Branch name -> values; arrays (or scalars) broadcast to one batch size
+            chunk_size (int | None): Variants solved per np.linalg.solve call, see SweepModel.solve
+        Returns:
+            tuple[dict, dict]: (node voltages keyed by node name, TensionSource currents keyed by branch name),
+                               each an array with one value per variant
+        """
+        model = SweepModel(self, list(values))
+        arrays = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in values.values()])
+        solution = model.solve([a.reshape(-1) for a in arrays], chunk_size)
+        return model.voltages(solution), model.source_currents(solution)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import numpy as np
+from .Branch import Branch, Resistor, IndependentCurrentSource, CurrentDependentCurrentSource, TensionDependentCurrentSource, \
+                    TensionSource
+from .LinearSystem import sparse
+
+class Results:
+    """
+    Every node voltage and branch current, voltage and power of a solved circuit, computed at once with NumPy.
+    Arrays are indexed by Node.id and Branch.id; values that the solution doesn't determine are NaN.
+    Branch currents go from nodes[0] to nodes[1] through the branch, branch voltages are v(nodes[0]) - v(nodes[1]),
+    so power is the power absorbed by the branch (negative for a source delivering power).
+    Built by Circuit.results after a solve, see there.
+    """
+    def __init__(self, circuit):
+        n_branches = len(circuit.branches)
+        self.node_voltages = np.array([n.v if n.solved and n.v is not None else np.nan for n in circuit.nodes], dtype=float)
+        if circuit.gnd is not None:
+            self.node_voltages[circuit.gnd.id] = 0
+
+        # incidence.T @ node_voltages, by indexing so that unknown voltages stay local to their branches
+        self.ends = np.array([(b.nodes[0].id, b.nodes[1].id) for b in circuit.branches], dtype=np.int64).reshape(-1, 2)
+        self.voltages = self.node_voltages[self.ends[:, 0]] - self.node_voltages[self.ends[:, 1]]
+        self._incidence = None
+
+        resistors, resistances = [], []
+        fixed, fixed_values = [], []
+        vccs, vccs_gains, vccs_controls = [], [], []
+        cccs, cccs_gains, cccs_controls = [], [], []
+        for b in circuit.branches:
+            if isinstance(b, Resistor):
+                resistors.append(b.id)
+                resistances.append(b.r)
+            elif isinstance(b, IndependentCurrentSource):
+                fixed.append(b.id)
+                fixed_values.append(b.value)
+            elif isinstance(b, TensionSource):
+                fixed.append(b.id)
+                fixed_values.append(np.nan if b.i is None else -b.i)
+            elif isinstance(b, TensionDependentCurrentSource):
+                vccs.append(b.id)
+                vccs_gains.append(b.multiplier)
+                vccs_controls.append((b.v_plus.id, b.v_minus.id))
+            elif isinstance(b, CurrentDependentCurrentSource):
+                cccs.append(b.id)
+                direction = 1 if b.current_out_of == b.branch_of_current.nodes[0] else -1
+                cccs_gains.append(direction * b.multiplier)
+                cccs_controls.append(b.branch_of_current.id)
+
+        self.currents = np.full(n_branches, np.nan)
+        self.currents[resistors] = self.voltages[resistors] / np.array(resistances, dtype=float)
+        self.currents[fixed] = np.array(fixed_values, dtype=float)
+        if vccs:
+            controls = np.array(vccs_controls, dtype=np.int64)
+            self.currents[vccs] = np.array(vccs_gains) * (self.node_voltages[controls[:, 0]] - self.node_voltages[controls[:, 1]])
+        if cccs:
+            # A current controlled source may be controlled by another one: one pass per level of the chain
+            gains, controls = np.array(cccs_gains), np.array(cccs_controls, dtype=np.int64)
+            for _ in range(len(cccs)):
+                previous = self.currents[cccs]
+                self.currents[cccs] = gains * self.currents[controls]
+                if np.array_equal(previous, self.currents[cccs], equal_nan=True):
+                    break
+
+        self.power = self.voltages * self.currents
+
+    @property
+    def incidence(self):
+        """Node-branch incidence matrix, see incidence_matrix."""
+        if self._incidence is None:
+            self._incidence = incidence_matrix(len(self.node_voltages), self.ends)
+        return self._incidence
+
+    def kcl_residual(self) -> np.ndarray:
+        """Net current leaving every node through its branches, zero up to rounding where the solution is complete."""
+        return np.asarray(self.incidence @ self.currents, dtype=float).reshape(-1)
+
+    def current(self, branch: Branch) -> float:
+        """Current from nodes[0] to nodes[1] through the branch."""
+        return float(self.currents[branch.id])
+
+    def voltage(self, branch: Branch) -> float:
+        """v(nodes[0]) - v(nodes[1])."""
+        return float(self.voltages[branch.id])
+
+    def absorbed_power(self, branch: Branch) -> float:
+        return float(self.power[branch.id])
+
+    def total_power(self) -> float:
+        """Sum of the power absorbed by every branch, zero up to rounding (Tellegen's theorem)."""
+        return float(np.nansum(self.power))
+
+def incidence_matrix(n_nodes: int, ends: np.ndarray):
+    """
+    Node-branch incidence matrix, shape (nodes, branches): +1 at nodes[0] and -1 at nodes[1] of every branch,
+    given as ends[branch] = (nodes[0].id, nodes[1].id). Sparse if scipy is installed.
+    """
+    n_branches = len(ends)
+    rows = np.concatenate([ends[:, 0], ends[:, 1]])
+    cols = np.tile(np.arange(n_branches, dtype=np.int64), 2)
+    data = np.concatenate([np.ones(n_branches), -np.ones(n_branches)])
+    if sparse is not None:
+        return sparse.csr_matrix((data, (rows, cols)), shape=(n_nodes, n_branches))
+    matrix = np.zeros((n_nodes, n_branches))
+    np.add.at(matrix, (rows, cols), data)
+    return matrix
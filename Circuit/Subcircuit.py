@@ -0,0 +1,183 @@
+"""
+Reusable subcircuits. A Subcircuit is a Circuit of its own with named port nodes; its internal nodes are eliminated
+once (Schur complement, i.e. Kron reduction) into a Norton equivalent at the ports, cached while its values don't
+change, and every SubcircuitInstance stamps only that equivalent into the parent circuit:
+
+    cell = Subcircuit(definition, ["IN", "OUT"])
+    for k in range(100):
+        SubcircuitInstance(cell, [nodes[k], nodes[k + 1]], name=f"X{k}")
+    parent.solve()
+    parent.get_branch("X7").internal_voltages()   # recovered on demand
+
+The ground of the definition is the reference of the ports; each instance maps it to a parent node, the parent
+ground by default.
+"""
+from __future__ import annotations
+import numpy as np
+from .Circuit import Circuit
+from .Node import Node
+from .Branch import Branch
+from .Equation import Equation
+from .LinearSystem import Factorization
+from .PreparedCircuit import PreparedCircuit
+
+class PortEquivalent:
+    """
+    Norton equivalent of a subcircuit at its ports, relative to its ground: I = y v + j, with I the currents entering
+    the subcircuit at the ports and v the port voltages. Keeps what is needed to recover the internal variables
+    from the port voltages: x = x0 - dx v.
+    """
+    def __init__(self, subcircuit: Subcircuit, backend: str = 'auto'):
+        prepared = PreparedCircuit(subcircuit.circuit, backend)
+        row_of_node = {source.id: row for row, (kind, source) in enumerate(prepared.sources) if kind == 'node'} # type:ignore
+        for port in subcircuit.ports:
+            if port.id not in row_of_node or port not in prepared.index:
+                raise Exception(f"The port {port.name} of the subcircuit has no equation of its own.")
+        port_rows = [row_of_node[p.id] for p in subcircuit.ports]
+        port_cols = [prepared.index[p] for p in subcircuit.ports]
+        inner_rows = np.setdiff1d(np.arange(prepared.shape[0]), port_rows)
+        inner_cols = np.setdiff1d(np.arange(prepared.shape[1]), port_cols)
+        if len(inner_rows) != len(inner_cols):
+            raise Exception(f"The subcircuit has {len(inner_rows)} internal equations for {len(inner_cols)} internal variables.")
+
+        matrix = prepared.matrix()
+        if not isinstance(matrix, np.ndarray):
+            matrix = matrix.tocsr()
+        a_pp = _dense(matrix[port_rows][:, port_cols])
+        a_pi = matrix[port_rows][:, inner_cols]
+        a_ip = _dense(matrix[inner_rows][:, port_cols])
+        rhs_p, rhs_i = prepared.rhs[port_rows], prepared.rhs[inner_rows]
+
+        n_ports = len(port_cols)
+        if len(inner_cols):
+            try:
+                solved = Factorization(matrix[inner_rows][:, inner_cols]).solve(np.column_stack([a_ip, rhs_i]))
+            except np.linalg.LinAlgError as e:
+                raise Exception(f"The internal nodes of the subcircuit are not determined by its port voltages ({e}), "
+                                "e.g. a port fixed by a tension source.") from e
+        else:
+            solved = np.zeros((0, n_ports + 1))
+        self.dx, self.x0 = solved[:, :n_ports], solved[:, n_ports]
+        self.y = a_pp - a_pi @ self.dx
+        self.j = a_pi @ self.x0 - rhs_p
+        self.variables = [prepared.variables[c] for c in inner_cols]
+
+    def internal(self, port_voltages: np.ndarray) -> dict:
+        """The internal variables for the given port voltages, keyed as the variables of the definition."""
+        return dict(zip(self.variables, (self.x0 - self.dx @ port_voltages).tolist()))
+
+class Subcircuit:
+    """
+    Definition of a reusable subcircuit, see the module documentation.
+    """
+    def __init__(self, circuit: Circuit, ports: list[Node | str], name: str = ""):
+        """
+        Args:
+            circuit (Circuit): The definition, with a ground node as the reference of the ports
+            ports (list[Node | str]): The port nodes of the definition, or their names
+        """
+        if circuit.gnd is None:
+            raise Exception("A subcircuit needs a ground node as the reference of its ports.")
+        self.circuit = circuit
+        self.name = name
+        self.ports: list[Node] = []
+        for port in ports:
+            if (node := circuit[port] if isinstance(port, str) else port) is None:
+                raise Exception(f"There is no node named {port} in the subcircuit.")
+            if node.gnd or node in self.ports:
+                raise Exception(f"{node.name} can't be a port: ports are distinct nodes other than the ground.")
+            self.ports.append(node)
+        # (key, PortEquivalent) of the latest values only, so sweeping a value doesn't keep every equivalent
+        self.cached: tuple | None = None
+        self.computed = 0
+
+    def key(self) -> tuple:
+        """Topology version and branch values of the definition: the equivalent changes only with it."""
+        return (self.circuit.topology_version, *(b.stamp_key() for b in self.circuit.branches))
+
+    def equivalent(self, backend: str = 'auto') -> PortEquivalent:
+        """The port equivalent for the current branch values, computed again only when they change."""
+        key = self.key()
+        if self.cached is None or self.cached[0] != key:
+            self.cached = (key, PortEquivalent(self, backend))
+            self.computed += 1
+        return self.cached[1]
+
+class SubcircuitInstance(Branch):
+    """
+    A Subcircuit placed in a circuit: a branch between the port nodes and the reference node that draws the Norton
+    currents of the port equivalent.
+    """
+    def __init__(self, subcircuit: Subcircuit, ports: list[Node], reference: Node | None = None, name: str = ""):
+        """
+        Args:
+            subcircuit (Subcircuit): The definition
+            ports (list[Node]): The node of the circuit connected to every port, in the order of subcircuit.ports
+            reference (Node | None): The node connected to the ground of the subcircuit, the ground of the circuit if None
+        """
+        if len(ports) != len(subcircuit.ports):
+            raise Exception(f"{name}: the subcircuit has {len(subcircuit.ports)} ports, {len(ports)} nodes given.")
+        reference = reference if reference is not None else ports[0].circuit.gnd
+        if reference is None:
+            raise Exception(f"{name}: a reference node is needed in a circuit without ground.")
+        self.subcircuit = subcircuit
+        self.ports = list(ports)
+        self.reference = reference
+        self._internal: tuple | None = None
+        # Every distinct node once, so a node connected to several ports gets one equation from the instance
+        super().__init__(list(dict.fromkeys(self.ports + [reference])), 0, name=name)
+
+    def get_current_eq(self, node: Node) -> Equation | None:
+        if node not in self.nodes:
+            return None
+        equivalent = self.subcircuit.equivalent()
+        y, j = equivalent.y, equivalent.j
+        eq = Equation({})
+        for k, port in enumerate(self.ports):
+            sign = (port == node) - (self.reference == node)
+            if sign == 0:
+                continue
+            # Current entering port k, leaving the node
+            for col, other in enumerate(self.ports):
+                eq[other] += sign * y[k, col]
+            eq[self.reference] -= sign * y[k].sum()
+            eq[None] += sign * j[k]
+        return eq
+
+    def get_aux_eq(self) -> Equation | None:
+        return None
+
+    def stamp_key(self):
+        # The value of the instance is always 0: its rows change with the values inside the definition
+        return self.subcircuit.key()
+
+    def port_voltages(self) -> np.ndarray:
+        if not all(n.solved for n in self.nodes):
+            raise Exception(f"{self.name}: the circuit is not solved.")
+        return np.array([p.v - self.reference.v for p in self.ports]) # type:ignore
+
+    def internal_voltages(self) -> dict[str, float]:
+        """
+        Voltages of every node of the subcircuit in this instance, keyed by name in the definition, recovered from
+        the port voltages of the solved circuit on first query.
+        """
+        port_voltages = self.port_voltages()
+        key = (self.subcircuit.key(), *port_voltages.tolist())
+        if self._internal is None or self._internal[0] != key:
+            v_ref = self.reference.v
+            voltages = {self.subcircuit.circuit.gnd.name: v_ref} # type:ignore
+            voltages.update({port.name: node.v for port, node in zip(self.subcircuit.ports, self.ports)})
+            for var, value in self.subcircuit.equivalent().internal(port_voltages).items():
+                if isinstance(var, Node):
+                    voltages[var.name] = value + v_ref
+            self._internal = (key, voltages)
+        return self._internal[1]
+
+    def voltage(self, name: str) -> float:
+        """Voltage of a node of the subcircuit, by name in the definition."""
+        if (v := self.internal_voltages().get(name)) is None:
+            raise Exception(f"There is no node named {name} in the subcircuit.")
+        return v
+
+def _dense(matrix) -> np.ndarray:
+    return matrix if isinstance(matrix, np.ndarray) else matrix.toarray()
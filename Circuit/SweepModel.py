@@ -0,0 +1,125 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import numpy as np
+from .Branch import Resistor, IndependentCurrentSource, TensionSource
+
+if TYPE_CHECKING:
+    from .PreparedCircuit import PreparedCircuit
+
+SWEEP_CHUNK_ELEMENTS = 2**25
+
+def stamp_parameter(branch, value):
+    """The quantity the equations are affine in: the conductance of a resistor, the value of anything else."""
+    return 1 / value if isinstance(branch, Resistor) else value
+
+def parameter_value(branch, parameter):
+    return 1 / parameter if isinstance(branch, Resistor) else parameter
+
+class SweepModel:
+    """
+    Batched form of a prepared nodal system for sweeping the values of some branches.
+    The system is affine in the stamp parameter of every branch (see stamp_parameter), so each variant
+    is stamped as A0 + sum((p - p0) * dA) with NumPy and a whole chunk is solved by one batched np.linalg.solve.
+    The model only holds NumPy arrays and names, so it is cheap to pickle to worker processes.
+    """
+    def __init__(self, prepared: PreparedCircuit, names: list[str]):
+        """
+        Args:
+            prepared (PreparedCircuit): The prepared circuit, at its nominal values
+            names (list[str]): The swept branches
+        """
+        prepared.update()
+        if prepared.shape[0] != prepared.shape[1]:
+            raise np.linalg.LinAlgError('Last 2 dimensions of the array must be square')
+
+        branches = [prepared.branch(name) for name in names]
+        swept = {b.id for b in branches}
+        for b in branches:
+            if getattr(b, 'branch_of_current', None) is not None and b.branch_of_current.id in swept: # type:ignore
+                raise Exception(f"{b.name} and the branch controlling it can't be swept together.")
+
+        self.names = names
+        self.size = prepared.shape[1]
+        self.matrix = np.zeros(prepared.shape)
+        self.matrix[prepared.system.rows, prepared.system.cols] = prepared.data
+        self.rhs = prepared.rhs.copy()
+        self.resistor = np.array([isinstance(b, Resistor) for b in branches], dtype=bool)
+        self.nominal = np.array([stamp_parameter(b, b.value) for b in branches], dtype=float)
+        self.derivatives = []
+        for b in branches:
+            positions, d_data, rows, d_rhs = prepared.derivative(b)
+            self.derivatives.append((prepared.system.rows[positions], prepared.system.cols[positions], d_data, rows, d_rhs))
+
+        # Outputs
+        variables = prepared.variables
+        self.node_names = [var.name for var in variables if not isinstance(var, tuple)]
+        self.node_cols = np.array([col for col, var in enumerate(variables) if not isinstance(var, tuple)], dtype=np.int64)
+        self.source_names = [var[0].name for var in variables if isinstance(var, tuple) and isinstance(var[0], TensionSource)]
+        self.source_cols = np.array([col for col, var in enumerate(variables) if isinstance(var, tuple) and isinstance(var[0], TensionSource)], dtype=np.int64)
+
+        # Signed current of every branch, from nodes[0] to nodes[1] through the branch
+        column = {var: col for col, var in enumerate(variables)}
+        node_col = lambda n: column.get(n, -1)
+        swept_index = {b.id: k for k, b in enumerate(branches)}
+        self.branch_names = [b.name for b in prepared.circuit.branches]
+        self.resistors = [(k, node_col(b.nodes[0]), node_col(b.nodes[1]), 1 / b.r, swept_index.get(b.id, -1))
+                          for k, b in enumerate(prepared.circuit.branches) if isinstance(b, Resistor)]
+        self.current_sources = [(k, b.value, swept_index.get(b.id, -1))
+                                for k, b in enumerate(prepared.circuit.branches) if isinstance(b, IndependentCurrentSource)]
+        self.current_vars = [(k, column[(b, b.nodes[0])], -1 if isinstance(b, TensionSource) else 1)
+                             for k, b in enumerate(prepared.circuit.branches) if (b, b.nodes[0]) in column]
+
+    def parameters(self, values: list[np.ndarray]) -> np.ndarray:
+        """Stamp parameters, shape (batch, swept branches), of branch values given per swept branch."""
+        values = np.array(values, dtype=float).reshape(len(self.names), -1).T
+        return np.where(self.resistor, 1 / values, values)
+
+    def solve(self, values: list[np.ndarray], chunk_size: int | None = None) -> np.ndarray:
+        """
+        Args:
+            values (list[np.ndarray]): One array of values per swept branch, all of the batch size
+            chunk_size (int | None): Variants solved per np.linalg.solve call, by default as many as fit in
+                                     about SWEEP_CHUNK_ELEMENTS matrix elements
+        Returns:
+            np.ndarray: The solutions, shape (batch, variables)
+        """
+        n = self.size
+        deltas = self.parameters(values) - self.nominal
+        batch = deltas.shape[0]
+        chunk_size = chunk_size or max(1, SWEEP_CHUNK_ELEMENTS // max(1, n * n))
+
+        solution = np.empty((batch, n))
+        for start in range(0, batch, chunk_size):
+            stop = min(start + chunk_size, batch)
+            a = np.broadcast_to(self.matrix, (stop - start, n, n)).copy()
+            b = np.broadcast_to(self.rhs, (stop - start, n)).copy()
+            for k, (rows, cols, d_data, d_rows, d_rhs) in enumerate(self.derivatives):
+                delta = deltas[start:stop, k, None]
+                a[:, rows, cols] += delta * d_data
+                b[:, d_rows] += delta * d_rhs
+            solution[start:stop] = np.linalg.solve(a, b[..., None])[..., 0]
+        return solution
+
+    def voltages(self, solution: np.ndarray) -> dict[str, np.ndarray]:
+        return {name: solution[:, col] for name, col in zip(self.node_names, self.node_cols)}
+
+    def source_currents(self, solution: np.ndarray) -> dict[str, np.ndarray]:
+        """Currents of the tension sources, with the sign of TensionSource.i."""
+        return {name: solution[:, col] for name, col in zip(self.source_names, self.source_cols)}
+
+    def branch_currents(self, solution: np.ndarray, values: list[np.ndarray]) -> np.ndarray:
+        """
+        Signed current of every branch of the circuit, from its nodes[0] to its nodes[1] through the branch.
+        Returns:
+            np.ndarray: shape (batch, branches), columns in Circuit.branches order
+        """
+        parameters = self.parameters(values)
+        padded = np.concatenate([solution, np.zeros((solution.shape[0], 1))], axis=1) # column -1 is the ground
+        currents = np.zeros((solution.shape[0], len(self.branch_names)))
+        for k, c0, c1, y, swept in self.resistors:
+            currents[:, k] = (padded[:, c0] - padded[:, c1]) * (parameters[:, swept] if swept >= 0 else y)
+        for k, value, swept in self.current_sources:
+            currents[:, k] = parameters[:, swept] if swept >= 0 else value
+        for k, col, sign in self.current_vars:
+            currents[:, k] = sign * solution[:, col]
+        return currents
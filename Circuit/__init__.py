@@ -1,3 +1,4 @@
 from .Circuit import *
+from .SweepModel import SweepModel
 
-__all__ = ["Circuit", "Node", "Branch", "Equation", "Resistor", "IndependentCurrentSource", "CurrentDependentCurrentSource", "TensionDependentCurrentSource", "IndependentTensionSource", "CurrentDependentTensionSource", "TensionDependentTensionSource", "TensionSource"]
\ No newline at end of file
+__all__ = ["Circuit", "Node", "Branch", "Equation", "Resistor", "IndependentCurrentSource", "CurrentDependentCurrentSource", "TensionDependentCurrentSource", "IndependentTensionSource", "CurrentDependentTensionSource", "TensionDependentTensionSource", "TensionSource", "LinearSystem", "PreparedCircuit", "SweepModel"]
\ No newline at end of file
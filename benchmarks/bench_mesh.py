@@ -0,0 +1,33 @@
+"""
+Mesh analysis (LoopAnalyzer.solve) against nodal analysis (Circuit.solve) on a resistor grid:
+time of each and the largest difference between their branch currents.
+
+    python benchmarks/bench_mesh.py [grid side]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Circuit.LoopAnalyzer import LoopAnalyzer
+from generators import grid
+
+if __name__ == '__main__':
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    circuit = grid(side)
+
+    start = time.perf_counter()
+    circuit.solve()
+    nodal_time = time.perf_counter() - start
+    expected = dict(zip(circuit.branches, circuit.results.currents.tolist()))
+
+    start = time.perf_counter()
+    analyzer = LoopAnalyzer(circuit)
+    mesh = analyzer.solve()
+    mesh_time = time.perf_counter() - start
+
+    error = max(abs(mesh[b] - i) for b, i in expected.items())
+    print(f"{side}x{side} grid, {len(circuit.branches)} branches, {len(analyzer.loops)} loops")
+    print(f"Circuit.solve      {nodal_time * 1e3:10.3f} ms")
+    print(f"LoopAnalyzer.solve {mesh_time * 1e3:10.3f} ms")
+    print(f"max |difference|   {error:10.3e} A")
@@ -0,0 +1,44 @@
+"""
+Per-iteration cost of re-solving a circuit after a value change:
+Circuit.unsolve + Circuit.solve against PreparedCircuit.solve.
+
+    python benchmarks/bench_prepared.py [grid side] [iterations]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generators import grid
+
+def per_iteration(run, iterations: int) -> float:
+    start = time.perf_counter()
+    for k in range(iterations):
+        run(k)
+    return (time.perf_counter() - start) / iterations
+
+if __name__ == '__main__':
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    circuit = grid(side)
+    load = circuit.get_branch("RL")
+
+    def full(k):
+        load.set_value(1 + k)
+        circuit.unsolve()
+        circuit.solve()
+
+    start = time.perf_counter()
+    prepared = circuit.prepare()
+    prepare_time = time.perf_counter() - start
+
+    def prepared_solve(k):
+        prepared.solve({"RL": 1 + k})
+
+    full_time = per_iteration(full, iterations)
+    prepared_time = per_iteration(prepared_solve, iterations)
+    print(f"{side}x{side} grid, {len(circuit.branches)} branches, backend {prepared.backend}")
+    print(f"Circuit.solve         {full_time * 1e3:10.3f} ms/iteration")
+    print(f"PreparedCircuit.solve {prepared_time * 1e3:10.3f} ms/iteration (prepare {prepare_time * 1e3:.3f} ms once)")
+    print(f"speedup               {full_time / prepared_time:10.1f}x")
@@ -0,0 +1,109 @@
+"""
+Parameterized circuits for the benchmarks. Every generator takes a size, roughly the number of nodes,
+and returns a new Circuit with its ground and a tension source driving it.
+"""
+import sys
+import os
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Circuit import Circuit, Node, Resistor, IndependentTensionSource, IndependentCurrentSource, \
+                    CurrentDependentCurrentSource, TensionDependentCurrentSource
+
+def r2r_ladder(bits: int) -> Circuit:
+    """R-2R ladder DAC with every bit set: a chain of R resistors with a 2R resistor to ground at every node."""
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    nodes = [Node(circuit, name=f"B{k}") for k in range(bits)]
+    IndependentTensionSource(1, gnd, nodes[0], name="VREF")
+    for k, node in enumerate(nodes):
+        Resistor(2e3, node, gnd, name=f"R2_{k}")
+        if k + 1 < bits:
+            Resistor(1e3, node, nodes[k + 1], name=f"R_{k}")
+    Resistor(2e3, nodes[-1], gnd, name="RT")
+    return circuit
+
+def grid(side: int, cols: int | None = None) -> Circuit:
+    """side x cols resistor grid (square by default) driven at a corner, with a load at the opposite one."""
+    cols = side if cols is None else cols
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    nodes = [[Node(circuit, name=f"N{i}_{j}") for j in range(cols)] for i in range(side)]
+    IndependentTensionSource(1, gnd, nodes[0][0], name="VS")
+    for i in range(side):
+        for j in range(cols):
+            if i + 1 < side:
+                Resistor(1, nodes[i][j], nodes[i + 1][j], name=f"RV{i}_{j}")
+            if j + 1 < cols:
+                Resistor(1, nodes[i][j], nodes[i][j + 1], name=f"RH{i}_{j}")
+    Resistor(1, nodes[-1][-1], gnd, name="RL")
+    return circuit
+
+def square_grid(size: int) -> Circuit:
+    """grid with about size nodes."""
+    return grid(max(2, round(size ** 0.5)))
+
+def random_sparse(size: int, degree: float = 3, seed: int = 0) -> Circuit:
+    """
+    Random connected graph: a random spanning tree of resistors plus random extra resistors up to the
+    mean degree, with a few current sources injecting into random nodes.
+    """
+    rng = random.Random(seed)
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    nodes = [gnd] + [Node(circuit, name=f"N{k}") for k in range(size)]
+    IndependentTensionSource(1, gnd, nodes[1], name="VS")
+    for k in range(2, len(nodes)):
+        Resistor(rng.uniform(1, 10), nodes[k], nodes[rng.randrange(k)], name=f"RT{k}")
+    for k in range(int(size * (degree / 2 - 1))):
+        a, b = rng.sample(nodes, 2)
+        Resistor(rng.uniform(1, 10), a, b, name=f"RX{k}")
+    for k in range(max(1, size // 50)):
+        IndependentCurrentSource(rng.uniform(0, 1e-3), gnd, rng.choice(nodes[2:] or nodes[1:]), name=f"IS{k}")
+    return circuit
+
+def dependent_chain(size: int) -> Circuit:
+    """
+    Chain of amplifier stages, alternating tension controlled and current controlled current sources,
+    each stage controlled by the previous one.
+    """
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    previous = Node(circuit, name="IN")
+    IndependentTensionSource(1, gnd, previous, name="VS")
+    load = Resistor(1e3, previous, gnd, name="RIN")
+    for k in range(size - 1):
+        out = Node(circuit, name=f"S{k}")
+        if k % 2 == 0:
+            TensionDependentCurrentSource(1e-3, gnd, out, previous, gnd, name=f"G{k}")
+        else:
+            CurrentDependentCurrentSource(1, gnd, out, load, previous, name=f"F{k}")
+        load = Resistor(1e3, out, gnd, name=f"RL{k}")
+        previous = out
+    return circuit
+
+def supernodes(size: int, group: int = 5) -> Circuit:
+    """
+    Floating groups of nodes joined by tension sources, each group tied to the ground and to the next group by resistors.
+    """
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    first = Node(circuit, name="IN")
+    IndependentTensionSource(1, gnd, first, name="VS")
+    previous = first
+    for g in range(max(1, size // group)):
+        members = [Node(circuit, name=f"G{g}_{k}") for k in range(group)]
+        for k, (a, b) in enumerate(zip(members, members[1:])):
+            IndependentTensionSource(0.1, a, b, name=f"V{g}_{k}")
+        Resistor(1, previous, members[0], name=f"RS{g}")
+        Resistor(10, members[-1], gnd, name=f"RG{g}")
+        previous = members[-1]
+    return circuit
+
+GENERATORS = {
+    'r2r_ladder': r2r_ladder,
+    'grid': square_grid,
+    'random_sparse': random_sparse,
+    'dependent_chain': dependent_chain,
+    'supernodes': supernodes,
+}
@@ -0,0 +1,121 @@
+"""
+Scaling benchmark: times every phase on every generator (see generators.py) across sizes, records the
+peak traced memory of each phase and writes the results as JSON, with the scaling exponent of every
+(generator, phase): the slope of log(time) against log(branches).
+
+    python benchmarks/suite.py [--sizes 100 400 1600] [--generators grid r2r_ladder] [--repeat 3] [--out results.json]
+
+Phases:
+    construct   building the circuit
+    solve       Circuit.solve
+    nodal       NodalAnalyzer.get_conductances_matrix
+    find_loops  LoopAnalyzer.find_loops
+    mesh        LoopAnalyzer.get_resistance_matrix, loops already found
+A phase that raises is recorded with its error and skipped at the larger sizes.
+"""
+import sys
+import os
+import time
+import json
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Circuit.NodalAnalyzer import NodalAnalyzer
+from Circuit.LoopAnalyzer import LoopAnalyzer
+from generators import GENERATORS
+
+def phases(build, size: int) -> dict:
+    """Every phase as (setup, run): setup builds what the phase needs outside the measured time."""
+    def loops_found():
+        analyzer = LoopAnalyzer(build(size))
+        analyzer.find_loops()
+        return analyzer
+
+    return {
+        'construct': (lambda: size, build),
+        'solve': (lambda: build(size), lambda c: c.solve()),
+        'nodal': (lambda: build(size), lambda c: NodalAnalyzer(c).get_conductances_matrix()),
+        'find_loops': (lambda: LoopAnalyzer(build(size)), lambda a: a.find_loops()),
+        'mesh': (loops_found, lambda a: a.get_resistance_matrix()),
+    }
+
+def measure(setup, run, repeat: int) -> tuple[float, int]:
+    """
+    Returns:
+        tuple[float, int]: (best time of repeat runs in seconds, peak traced memory of one run in bytes)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        best = min(best, time.perf_counter() - start)
+
+    # Tracing slows the run down, so memory is measured apart from the time
+    arg = setup()
+    tracemalloc.start()
+    try:
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def scaling(results: list[dict]) -> list[dict]:
+    exponents = []
+    keys = sorted({(r['generator'], r['phase']) for r in results})
+    for generator, phase in keys:
+        points = [(r['branches'], r['seconds']) for r in results
+                  if r['generator'] == generator and r['phase'] == phase and r.get('seconds', 0) > 0]
+        if len(points) >= 2:
+            x, y = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+            exponents.append({'generator': generator, 'phase': phase, 'exponent': float(np.polyfit(x, y, 1)[0])})
+    return exponents
+
+def run_suite(sizes: list[int], generators: list[str], repeat: int = 3) -> dict:
+    results = []
+    for name in generators:
+        build = GENERATORS[name]
+        failed: set[str] = set()
+        for size in sizes:
+            circuit = build(size)
+            for phase, (setup, run) in phases(build, size).items():
+                record = {'generator': name, 'size': size, 'nodes': len(circuit.nodes),
+                          'branches': len(circuit.branches), 'phase': phase}
+                if phase in failed:
+                    continue
+                try:
+                    record['seconds'], record['peak_bytes'] = measure(setup, run, repeat)
+                except Exception as e:
+                    record['error'] = f"{type(e).__name__}: {e}"
+                    failed.add(phase)
+                results.append(record)
+                print(f"{name:16} {size:7} {phase:11} " +
+                      (f"{record['seconds'] * 1e3:11.3f} ms {record['peak_bytes'] / 2**20:9.2f} MiB" if 'seconds' in record else record['error']))
+
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+        'scaling': scaling(results),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 400, 1600])
+    parser.add_argument('--generators', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'results.json'))
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.generators, args.repeat)
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=1)
+    print()
+    for s in report['scaling']:
+        print(f"{s['generator']:16} {s['phase']:11} time ~ branches^{s['exponent']:.2f}")
+    print(f"Results written to {args.out}")
@@ -261,3 +261,908 @@ def test_modified_nodal_unconected_node():
 
     with pytest.raises(Exception) as e_info:
         solution = circuit.solve()
+
+def test_sparse_backend_matches_dense():
+    pytest.importorskip("scipy")
+    results = []
+    for backend in ("dense", "sparse"):
+        circuit = Circuit()
+        gnd = Node(circuit, gnd=True)
+        v1 = Node(circuit, name="V1")
+        v2 = Node(circuit, name="V2")
+        v3 = Node(circuit, name="V3")
+
+        srcA = IndependentTensionSource(12, gnd, v1, name="SA")
+        srcB = IndependentCurrentSource(2*(10**-3), gnd, v3, name="SB")
+        r1 = Resistor(1*(10**3), v1, v2, name="R1")
+        r2 = Resistor(2*(10**3), v2, v3, name="R2")
+        r3 = Resistor(4*(10**3), v3, gnd, name="R3")
+        r4 = Resistor(4*(10**3), v2, gnd, name="R4")
+
+        solution = circuit.solve(backend=backend)
+        results.append(([solution[v] for v in (v1, v2, v3)], srcA.i))
+
+    (dense_v, dense_i), (sparse_v, sparse_i) = results
+    assert all(abs(d - s) < 1e-9 for d, s in zip(dense_v, sparse_v))
+    assert abs(dense_i - sparse_i) < 1e-12
+
+def test_sparse_backend_large_ladder():
+    pytest.importorskip("scipy")
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    nodes = [Node(circuit, name=f"N{k}") for k in range(500)]
+    src = IndependentTensionSource(1, gnd, nodes[0], name="S")
+    for k in range(499):
+        Resistor(1, nodes[k], nodes[k + 1], name=f"R{k}")
+    Resistor(1, nodes[-1], gnd, name="RL")
+
+    solution = circuit.solve()
+    assert abs(solution[nodes[-1]] - 1/500) < 1e-9
+    assert abs(src.i + 1/500) < 1e-9
+
+def test_sparse_backend_singular():
+    pytest.importorskip("scipy")
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+
+    src = IndependentCurrentSource(1, gnd, v1, name="S")
+
+    with pytest.raises(Exception):
+        circuit.solve(backend="sparse")
+
+def test_equation_canonical_form():
+    from Circuit.Equation import unique_equations
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+
+    a = Equation({v1: 0.1, v2: -0.3, None: 1})
+    b = Equation({v2: 0.6, v1: -0.2, None: -2})
+    c = Equation({v1: 0.1, v2: -0.3 + 1e-15, None: 1})
+    d = Equation({v1: 0.1, v2: -0.3, None: 2})
+
+    assert a.canonical() == b.canonical() == c.canonical()
+    assert a.canonical() != d.canonical()
+    assert hash(a.canonical()) == hash(b.canonical())
+    assert unique_equations([a, b, c, d, Equation()]) == [a, d, Equation()]
+    assert unique_equations([a, Equation(), Equation({None: 0})], drop_empty=True) == [a]
+
+def test_prepared_circuit_value_changes():
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    v3 = Node(circuit, name="V3")
+
+    srcA = IndependentTensionSource(12, gnd, v1, name="SA")
+    srcB = IndependentCurrentSource(2*(10**-3), gnd, v3, name="SB")
+    r1 = Resistor(1*(10**3), v1, v2, name="R1")
+    r2 = Resistor(2*(10**3), v2, v3, name="R2")
+    r3 = Resistor(4*(10**3), v3, gnd, name="R3")
+    srcC = CurrentDependentCurrentSource(2, v2, gnd, r3, v3, name="SC")
+
+    prepared = circuit.prepare()
+    for values in ({}, {"R1": 500, "SA": 6}, {"SC": 3, "R3": 100}, {"SB": 0}):
+        solution = prepared.solve(values)
+        prepared_i = srcA.i
+        circuit.unsolve()
+        expected = circuit.solve()
+        for v in (v1, v2, v3):
+            assert abs(solution[v] - expected[v]) < 1e-9
+        assert abs(prepared_i - srcA.i) < 1e-12
+
+    r2.set_value(3*(10**3))
+    solution = prepared.solve()
+    circuit.unsolve()
+    assert abs(solution[v3] - circuit.solve()[v3]) < 1e-9
+
+    # A gain prepared at 0 keeps its entries in the pattern
+    srcC.set_value(0)
+    prepared = circuit.prepare()
+    prepared.solve()
+    for gain in (2, 0):
+        solution = prepared.solve({"SC": gain})
+        circuit.unsolve()
+        expected = circuit.solve()
+        assert all(abs(solution[v] - expected[v]) < 1e-9 for v in (v1, v2, v3))
+
+    Resistor(1, v1, v3, name="R4")
+    with pytest.raises(Exception):
+        prepared.solve()
+
+def test_sweep_matches_individual_solves():
+    import numpy as np
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    v3 = Node(circuit, name="V3")
+
+    srcA = IndependentTensionSource(12, gnd, v1, name="SA")
+    srcB = IndependentCurrentSource(2*(10**-3), gnd, v3, name="SB")
+    r1 = Resistor(1*(10**3), v1, v2, name="R1")
+    r2 = Resistor(2*(10**3), v2, v3, name="R2")
+    r3 = Resistor(4*(10**3), v3, gnd, name="R3")
+    srcC = TensionDependentCurrentSource(10**-4, v2, gnd, v3, gnd, name="SC")
+
+    r1_values = np.linspace(500, 2000, 7)
+    sa_values = np.linspace(1, 13, 7)
+    voltages, currents = circuit.sweep({"R1": r1_values, "SA": sa_values, "SC": 2*(10**-4)}, chunk_size=3)
+    assert r1.value == 1*(10**3) and srcA.value == 12
+
+    for k in range(7):
+        r1.set_value(r1_values[k])
+        srcA.set_value(sa_values[k])
+        srcC.set_value(2*(10**-4))
+        circuit.unsolve()
+        solution = circuit.solve()
+        for v in (v1, v2, v3):
+            assert abs(voltages[v.name][k] - solution[v]) < 1e-9
+        assert abs(currents["SA"][k] - srcA.i) < 1e-12
+
+def test_sweep_rejects_controller_and_dependent_source():
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    r1 = Resistor(2, v1, gnd, name="R1")
+    src = CurrentDependentCurrentSource(2, gnd, v1, r1, v1, name="S")
+    Resistor(1, v1, gnd, name="R2")
+    IndependentCurrentSource(1, gnd, v1, name="I")
+
+    with pytest.raises(Exception):
+        circuit.sweep({"R1": [1, 2], "S": [1, 2]})
+
+def test_monte_carlo_divider():
+    from Circuit.MonteCarlo import MonteCarlo, Tolerance
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    src = IndependentTensionSource(10, gnd, v1, name="VS")
+    r1 = Resistor(1000, v1, v2, name="R1")
+    r2 = Resistor(1000, v2, gnd, name="R2")
+
+    distributions = {"R1": Tolerance(0.05), "R2": Tolerance(0.05, "normal")}
+    summary = MonteCarlo(circuit, distributions, seed=3, chunk_size=5000).run(20000)
+    assert summary["samples"] == 20000
+    v2_stats = summary["voltages"]["V2"]
+    assert abs(v2_stats["mean"] - 5) < 0.01
+    assert 0 < v2_stats["std"] < 0.2
+    assert v2_stats["min"] <= v2_stats["percentiles"][5] <= v2_stats["percentiles"][50] <= v2_stats["percentiles"][95] <= v2_stats["max"]
+    assert v2_stats["histogram"][0].sum() + v2_stats["underflow"] + v2_stats["overflow"] == 20000
+    assert abs(summary["currents"]["R1"]["mean"] - 0.005) < 1e-4
+
+    pooled = MonteCarlo(circuit, distributions, seed=3, chunk_size=5000).run(20000, workers=2)
+    assert pooled["voltages"]["V2"]["mean"] == v2_stats["mean"]
+    assert pooled["voltages"]["V2"]["std"] == v2_stats["std"]
+
+    # Samples outside the ranges of the first chunk are reported
+    wide = MonteCarlo(circuit, {"VS": lambda rng, size, nominal: nominal + rng.standard_cauchy(size)}, seed=1, chunk_size=100)
+    wide_stats = wide.run(5000)["voltages"]["V2"]
+    assert wide_stats["underflow"] + wide_stats["overflow"] > 0
+    assert wide_stats["histogram"][0].sum() + wide_stats["underflow"] + wide_stats["overflow"] == 5000
+    with pytest.raises(Exception):
+        wide.run(0)
+
+def test_sparse_row():
+    from Circuit.Equation import SparseRow, VariableIndex
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    src = IndependentTensionSource(5, gnd, v1, name="S")
+    r1 = Resistor(2, v1, v2, name="R1")
+    ids = VariableIndex(circuit.nodes)
+
+    a = r1.get_current_row(v1, ids)
+    b = src.get_current_row(v1, ids)
+    total = a + b * 2
+    assert len(a) == 2 and len(b) == 1
+    assert total.to_equation(ids) == Equation({v1: 0.5, v2: -0.5, (src, gnd): 2})
+    assert a.to_equation(ids) == r1.get_current_eq(v1)
+    assert ids((src, gnd)) == len(circuit.nodes)
+    assert src.get_aux_row(ids).to_equation(ids) == src.get_aux_eq()
+
+def test_row_assembly_matches_equations():
+    import numpy as np
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    v3 = Node(circuit, name="V3")
+
+    srcA = IndependentTensionSource(12, gnd, v1, name="SA")
+    srcB = IndependentCurrentSource(2*(10**-3), gnd, v3, name="SB")
+    r1 = Resistor(1*(10**3), v1, v2, name="R1")
+    r2 = Resistor(2*(10**3), v2, v3, name="R2")
+    r3 = Resistor(4*(10**3), v3, gnd, name="R3")
+    srcC = CurrentDependentCurrentSource(2, v2, gnd, r3, v3, name="SC")
+    srcD = TensionDependentCurrentSource(10**-4, v1, v3, v2, gnd, name="SD")
+
+    from_rows = LinearSystem.from_rows(*circuit.get_rows())
+    from_eqs = LinearSystem([*circuit.get_nodal_eqs(), *circuit.get_aux_eqs()], n_nodes=len(circuit.nodes))
+    assert from_rows.variables == from_eqs.variables
+    assert from_rows.shape == from_eqs.shape
+    rows_a = sorted(map(tuple, np.column_stack([from_rows.to_dense(), from_rows.rhs]).tolist()))
+    rows_b = sorted(map(tuple, np.column_stack([from_eqs.to_dense(), from_eqs.rhs]).tolist()))
+    assert rows_a == rows_b
+
+def test_fundamental_loops():
+    from Circuit.LoopAnalyzer import LoopAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    side = 6
+    nodes = [[Node(circuit, name=f"N{i}_{j}") for j in range(side)] for i in range(side)]
+    IndependentTensionSource(1, gnd, nodes[0][0], name="VS")
+    IndependentCurrentSource(1, nodes[-1][0], gnd, name="IS")
+    for i in range(side):
+        for j in range(side):
+            if i + 1 < side:
+                Resistor(1, nodes[i][j], nodes[i + 1][j])
+            if j + 1 < side:
+                Resistor(1, nodes[i][j], nodes[i][j + 1])
+    Resistor(1, nodes[-1][-1], gnd)
+    Resistor(1, nodes[0][-1], nodes[0][-1])
+
+    loops = LoopAnalyzer(circuit).find_loops()
+    assert len(loops) == (len(circuit.branches) - 1) - len(circuit.nodes) + 1
+
+    for loop in loops:
+        # Every branch goes from its node to the next one, closing the loop
+        for k, b in enumerate(loop.branches):
+            assert set(b.nodes) == {loop.nodes[k], loop.nodes[(k + 1) % len(loop.nodes)]}
+        assert len(set(loop.nodes)) == len(loop.nodes)
+
+    source = circuit.get_branch("IS")
+    assert len(source.loops) == 1
+
+    # A second analyzer replaces the loops of the first on the branches
+    again = LoopAnalyzer(circuit).find_loops()
+    assert len(again) == len(loops) and len(source.loops) == 1
+    assert all(set(b.loops) <= set(again) for b in circuit.branches)
+
+    # A ladder has short loops, whatever order its branches were added in
+    ladder = Circuit()
+    gnd = Node(ladder, gnd=True)
+    rungs = [Node(ladder) for _ in range(50)]
+    IndependentTensionSource(1, gnd, rungs[0])
+    for k, node in enumerate(rungs):
+        Resistor(2, node, gnd)
+        if k + 1 < len(rungs):
+            Resistor(1, node, rungs[k + 1])
+    assert max(len(loop.branches) for loop in LoopAnalyzer(ladder).find_loops()) == 3
+
+def test_loop_analyzer_solve():
+    from Circuit.LoopAnalyzer import LoopAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    v3 = Node(circuit, name="V3")
+    v4 = Node(circuit, name="V4")
+
+    vs = IndependentTensionSource(10, gnd, v1, name="VS")
+    r1 = Resistor(2, v1, v2, name="R1")
+    r2 = Resistor(4, v2, gnd, name="R2")
+    r3 = Resistor(3, v2, v3, name="R3")
+    r4 = Resistor(6, v3, gnd, name="R4")
+    src = IndependentCurrentSource(1, v3, v1, name="IS")
+    vccs = TensionDependentCurrentSource(0.5, v4, gnd, v2, v3, name="VCCS")
+    r5 = Resistor(5, v4, gnd, name="R5")
+
+    currents = LoopAnalyzer(circuit).solve()
+    mesh_vs_i = vs.i
+
+    circuit.solve()
+    for r in (r1, r2, r3, r4, r5):
+        assert abs(currents[r] - (r.nodes[0].v - r.nodes[1].v) / r.r) < 1e-9
+    assert abs(currents[src] - 1) < 1e-9
+    assert abs(currents[vccs] - 0.5 * (v2.v - v3.v)) < 1e-9
+    assert abs(mesh_vs_i - vs.i) < 1e-9
+
+def test_analyze_picks_smaller_system():
+    # A series chain: one loop, many nodes
+    chain = Circuit()
+    gnd = Node(chain, gnd=True)
+    nodes = [Node(chain, name=f"N{k}") for k in range(10)]
+    IndependentTensionSource(10, gnd, nodes[0], name="VS")
+    for a, b in zip(nodes, nodes[1:]):
+        Resistor(1, a, b)
+    Resistor(1, nodes[-1], gnd)
+
+    answer = chain.analyze()
+    assert chain.analysis["method"] == "mesh"
+    assert chain.analysis["size"] == chain.analysis["estimated"]["mesh"] == 1
+    mesh_v = {n: answer[n] for n in nodes}
+    chain.unsolve()
+    expected = chain.solve()
+    for n in nodes:
+        assert abs(mesh_v[n] - expected[n]) < 1e-9
+
+    # Analyzing again finds the same loops, not a stale set left on the branches
+    for _ in range(2):
+        chain.unsolve()
+        answer = chain.analyze()
+        assert chain.analysis["method"] == "mesh" and "fallback" not in chain.analysis
+        assert all(abs(answer[n] - expected[n]) < 1e-9 for n in nodes)
+    chain.unsolve()
+    chain.analyze('mesh')
+
+    # Parallel resistors: few nodes, many loops
+    bank = Circuit()
+    gnd = Node(bank, gnd=True)
+    v1 = Node(bank, name="V1")
+    IndependentCurrentSource(1, gnd, v1, name="IS")
+    for k in range(10):
+        Resistor(10, v1, gnd)
+
+    answer = bank.analyze()
+    assert bank.analysis["method"] == "nodal"
+    assert bank.analysis["size"] == bank.analysis["estimated"]["nodal"] == 1
+    assert abs(answer[v1] - 1) < 1e-9
+
+def test_path_tree_shared_between_dependent_sources():
+    from Circuit.LoopAnalyzer import LoopAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    chain = [Node(circuit, name=f"N{k}") for k in range(20)]
+    IndependentTensionSource(1, gnd, chain[0], name="VS")
+    for a, b in zip(chain, chain[1:]):
+        Resistor(1, a, b)
+    Resistor(1, chain[-1], gnd)
+    sources = []
+    for k in range(5):
+        out = Node(circuit, name=f"OUT{k}")
+        sources.append(TensionDependentCurrentSource(0.5, out, gnd, chain[3 * k + 4], chain[k], name=f"G{k}"))
+        Resistor(2, out, gnd)
+
+    path = circuit.get_path(chain[0], chain[5])
+    assert [n for _, n in path] == chain[:5]
+    assert all(set(b.nodes) == {chain[k], chain[k + 1]} for k, (b, _) in enumerate(path))
+    tree = circuit.path_tree
+    currents = LoopAnalyzer(circuit).solve()
+    assert circuit.path_tree is tree
+
+    circuit.unsolve()
+    circuit.solve()
+    for k, g in enumerate(sources):
+        assert abs(currents[g] - 0.5 * (chain[3 * k + 4].v - chain[k].v)) < 1e-9
+
+    Resistor(1, chain[0], chain[-1])
+    circuit.get_path(chain[0], chain[5])
+    assert circuit.path_tree is not tree
+
+def test_nodal_analyzer_super_nodes():
+    from Circuit.NodalAnalyzer import NodalAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="V2")
+    v3 = Node(circuit, name="V3")
+    v4 = Node(circuit, name="V4")
+
+    IndependentCurrentSource(1, gnd, v1, name="IS")
+    IndependentTensionSource(2, v1, v2, name="S1")
+    IndependentTensionSource(3, v3, v2, name="S2")
+    Resistor(2, v1, gnd)
+    Resistor(4, v3, gnd)
+    Resistor(1, v3, v4)
+    Resistor(1, v4, gnd)
+
+    analyzer = NodalAnalyzer(circuit)
+    eqs, aux = analyzer.get_conductances_matrix()
+    assert list(analyzer.super_nodes.values()) == [[v1, v2, v3]]
+    # KCL of V4 and one KCL for the super node
+    assert len(eqs) == 2
+
+    system = LinearSystem(eqs + aux)
+    solution = dict(zip(system.variables, system.solve()))
+    expected = circuit.solve()
+    for n in (v1, v2, v3, v4):
+        assert abs(solution[n] - expected[n]) < 1e-9
+
+def test_nodal_analyzer_eliminates_solved_nodes():
+    from Circuit.NodalAnalyzer import NodalAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    chain = [gnd] + [Node(circuit, name=f"N{k}") for k in range(2000)]
+    for a, b in zip(chain, chain[1:]):
+        IndependentTensionSource(0.01, a, b)
+    out = Node(circuit, name="OUT")
+    Resistor(1, chain[-1], out)
+    Resistor(3, out, gnd)
+
+    analyzer = NodalAnalyzer(circuit)
+    assert abs(chain[-1].v - 20) < 1e-9
+    eqs, aux = analyzer.get_conductances_matrix()
+    assert len(eqs) == 1 and aux == []
+    assert set(eqs[0].variables) - {None} == {out}
+    assert abs(-eqs[0][None] / eqs[0][out] - 15) < 1e-9
+    assert analyzer.reduction == {'rows': 2000, 'columns': 1}
+
+    # The equations passed in are not changed
+    given = [out.get_currents_eq()]
+    before = dict(given[0].dict)
+    assert analyzer.eliminate_solved_nodes(given)[0] is not given[0]
+    assert given[0].dict == before
+
+def test_netlist_round_trip():
+    import io
+    from Circuit.Netlist import load_netlist, write_netlist
+
+    netlist = """* divider with controlled sources
+F1 out 0 VS 2      ; controlled by a later card
+VS in 0 DC 10
+R1 in mid 1k
+R2 mid 0
++ 2k
+Rl out 0 500
+G1 g 0 mid 0 1m
+Rg g 0 1meg
+.end
+"""
+    circuit = load_netlist(io.StringIO(netlist))
+    assert [b.name for b in circuit.branches] == ["VS", "F1", "R1", "R2", "Rl", "G1", "Rg"]
+    assert circuit.get_branch("R2").value == 2000
+    assert circuit.get_branch("F1").current_out_of is circuit["in"]
+    expected = {n.name: v for n, v in circuit.solve().items() if isinstance(n, Node)}
+
+    text = io.StringIO()
+    write_netlist(circuit, text)
+    copy = load_netlist(io.StringIO(text.getvalue()))
+    for n, v in copy.solve().items():
+        if isinstance(n, Node):
+            assert abs(v - expected[n.name]) < 1e-9
+
+    with pytest.raises(Exception):
+        load_netlist(["F1 out 0 VX 2"])
+
+def test_binary_circuit_and_solution_files(tmp_path):
+    import numpy as np
+    from Circuit.BinaryFormat import save_circuit, load_circuit, save_solution, load_solution, read_arrays
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    v1 = Node(circuit, name="V1")
+    v2 = Node(circuit, name="Vção")
+    v3 = Node(circuit, name="V3")
+    IndependentTensionSource(12, gnd, v1, name="SA")
+    r1 = Resistor(1e3, v1, v2, name="R1")
+    Resistor(2e3, v2, v3, name="R2")
+    Resistor(4e3, v3, gnd, name="R3")
+    CurrentDependentCurrentSource(2, v2, gnd, r1, v1, name="SC")
+    TensionDependentCurrentSource(1e-3, v3, gnd, v1, v2, name="SG")
+
+    save_circuit(circuit, tmp_path / "circuit.bin")
+    arrays = read_arrays(tmp_path / "circuit.bin", "circuit")
+    assert isinstance(arrays["branch_value"], np.memmap)
+    assert arrays["branch_nodes"].tolist()[1] == [v1.id, v2.id]
+
+    copy = load_circuit(tmp_path / "circuit.bin")
+    assert [n.name for n in copy.nodes] == [n.name for n in circuit.nodes]
+    assert [(type(b), b.name, b.value) for b in copy.branches] == [(type(b), b.name, b.value) for b in circuit.branches]
+    assert copy.get_branch("SC").branch_of_current is copy.get_branch("R1")
+
+    expected = circuit.solve()
+    save_solution(circuit, tmp_path / "solution.bin")
+    solution = load_solution(tmp_path / "solution.bin", copy)
+    assert copy.solved and abs(copy["V3"].v - expected[v3]) < 1e-12
+    assert abs(copy.get_branch("SA").i - circuit.get_branch("SA").i) < 1e-12
+    assert len(solution["node_ids"]) == len(circuit.nodes)
+
+    with pytest.raises(Exception):
+        load_circuit(tmp_path / "solution.bin")
+
+def test_profiler_records_solver_phases():
+    import json
+    from Circuit.Instrumentation import Profiler
+    from Circuit.LoopAnalyzer import LoopAnalyzer
+    from Circuit.NodalAnalyzer import NodalAnalyzer
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    IndependentTensionSource(10, gnd, a)
+    Resistor(1, a, b)
+    Resistor(2, b, gnd)
+    Resistor(3, b, gnd)
+
+    circuit.solve()
+    with Profiler(condition=True) as profiler:
+        circuit.unsolve()
+        circuit.solve()
+        NodalAnalyzer(circuit).get_conductances_matrix()
+        LoopAnalyzer(circuit).solve()
+    circuit.unsolve()
+    circuit.solve()
+
+    names = [p['name'] for p in profiler.phases]
+    for name in ("rows", "assemble", "LinearSystem.solve", "Circuit.solve", "super_nodes", "deduplicate",
+                 "find_loops", "mesh_equations", "LoopAnalyzer.solve"):
+        assert name in names
+    solve = next(p for p in profiler.phases if p['name'] == "LinearSystem.solve")
+    assert solve['rows'] == solve['columns'] == 3 and solve['nnz'] > 0 and solve['condition'] >= 1
+    assert solve['depth'] == 1 and solve['seconds'] >= 0 and 'allocated_blocks' in solve
+    assert profiler.summary()["LinearSystem.solve"]['calls'] == 2
+    assert len(json.loads(profiler.to_json())) == len(profiler.phases)
+    assert all(e['ph'] == 'X' for e in profiler.chrome_trace()['traceEvents'])
+
+def test_results_currents_and_power():
+    import numpy as np
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    c = Node(circuit, name="C")
+    vs = IndependentTensionSource(10, gnd, a)
+    r1 = Resistor(2, a, b)
+    r2 = Resistor(3, b, gnd)
+    f = CurrentDependentCurrentSource(2, gnd, c, r1, a)
+    rl = Resistor(4, c, gnd)
+    g = TensionDependentCurrentSource(0.5, c, gnd, b, gnd)
+    assert circuit.results is None
+
+    circuit.solve()
+    results = circuit.results
+    assert results is circuit.results
+    assert abs(results.current(r1) - 2) < 1e-12 and abs(results.voltage(r2) - 6) < 1e-12
+    assert r2.i == 2 and abs(vs.i + 2) < 1e-12
+    assert f.i == results.current(f) and abs(g.i - 3) < 1e-12
+    assert np.allclose(results.kcl_residual(), 0) and abs(results.total_power()) < 1e-9
+    assert abs(results.absorbed_power(r1) - 8) < 1e-12 and results.absorbed_power(vs) < 0
+
+    r1.set_value(8)
+    circuit.unsolve()
+    circuit.solve()
+    assert circuit.results is not results and abs(r1.i - 10/11) < 1e-12
+    circuit.unsolve()
+    assert circuit.results is None and r1.i is None
+
+def test_superposition_matrix():
+    import numpy as np
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    c = Node(circuit, name="C")
+    vs = IndependentTensionSource(10, gnd, a, name="VS")
+    Resistor(2, a, b)
+    Resistor(3, b, gnd)
+    Resistor(4, b, c)
+    Resistor(5, c, gnd)
+    i1 = IndependentCurrentSource(1, gnd, c, name="I1")
+    TensionDependentCurrentSource(0.1, gnd, b, c, gnd, name="G")
+
+    sources, contributions = circuit.superposition()
+    assert sources == [vs, i1] and contributions.shape == (4, 2)
+    solution = circuit.solve()
+    assert np.allclose(contributions.sum(axis=1), [0] + [solution[n] for n in (a, b, c)])
+
+    circuit.unsolve()
+    vs.set_value(0)
+    alone = circuit.solve()
+    assert np.allclose(contributions[[b.id, c.id], 1], [alone[b], alone[c]])
+
+    prepared = circuit.prepare()
+    injections = np.zeros((4, 2))
+    injections[c.id, 0] = 1
+    injections[b.id, 1] = 2
+    response = prepared.excitation_response(injections)
+    assert np.allclose(response[:, 0], contributions[:, 1])
+    assert response[gnd.id, 1] == 0 and response[a.id, 1] == 0
+
+def test_subcircuit_instances():
+    from Circuit.Subcircuit import Subcircuit, SubcircuitInstance
+
+    def cell(circuit, gnd, a, b, suffix=""):
+        m = Node(circuit, name="M" + suffix)
+        Resistor(1, a, m, name="R1")
+        Resistor(2, m, b)
+        Resistor(4, m, gnd)
+        IndependentCurrentSource(0.5, gnd, m)
+        return m
+
+    definition = Circuit()
+    d_gnd = Node(definition, gnd=True)
+    cell(definition, d_gnd, Node(definition, name="IN"), Node(definition, name="OUT"))
+    sub = Subcircuit(definition, ["IN", "OUT"])
+
+    flat = Circuit()
+    f_gnd = Node(flat, gnd=True)
+    f_nodes = [Node(flat, name=f"N{k}") for k in range(4)]
+    IndependentTensionSource(10, f_gnd, f_nodes[0])
+    middles = [cell(flat, f_gnd, a, b, str(k)) for k, (a, b) in enumerate(zip(f_nodes, f_nodes[1:]))]
+    Resistor(3, f_nodes[-1], f_gnd)
+    expected = flat.solve()
+
+    parent = Circuit()
+    gnd = Node(parent, gnd=True)
+    nodes = [Node(parent, name=f"N{k}") for k in range(4)]
+    IndependentTensionSource(10, gnd, nodes[0])
+    instances = [SubcircuitInstance(sub, [a, b], name=f"X{k}") for k, (a, b) in enumerate(zip(nodes, nodes[1:]))]
+    Resistor(3, nodes[-1], gnd)
+    solution = parent.solve()
+
+    assert len(parent.nodes) == 5 and sub.computed == 1
+    for node, f_node in zip(nodes, f_nodes):
+        assert abs(solution[node] - expected[f_node]) < 1e-9
+    for instance, m in zip(instances, middles):
+        assert abs(instance.voltage("M") - expected[m]) < 1e-9
+    assert instances[1].internal_voltages()["IN"] == nodes[1].v
+
+    definition.get_branch("R1").set_value(5)
+    parent.unsolve()
+    parent.solve()
+    assert sub.computed == 2
+
+    # A prepared parent restamps the instances when a value inside the definition changes
+    prepared = parent.prepare()
+    prepared.solve()
+    for r1 in (9, 1):
+        definition.get_branch("R1").set_value(r1)
+        answer = prepared.solve()
+        parent.unsolve()
+        fresh = parent.solve()
+        assert all(abs(answer[var] - value) < 1e-9 for var, value in fresh.items())
+
+def test_thevenin_pairs():
+    import numpy as np
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    c = Node(circuit, name="C")
+    IndependentTensionSource(10, gnd, a)
+    Resistor(2, a, b)
+    r2 = Resistor(3, b, gnd, name="R2")
+    Resistor(5, b, c)
+    IndependentCurrentSource(1, gnd, c)
+
+    v, r, i = circuit.thevenin([(b, None), ("A", "B"), (c, b), (b, b)])
+    assert np.allclose(v, [7.2, 2.8, 5, 0]) and np.allclose(r, [1.2, 1.2, 5, 0])
+    assert np.allclose(i[:3], [6, 2.8 / 1.2, 1])
+
+    v, r, _ = circuit.thevenin([(c, None)])
+    prepared = circuit.prepared()
+    load = Resistor(4, c, gnd)
+    assert circuit.prepared() is not prepared
+    assert abs(circuit.solve()[c] - v[0] * 4 / (4 + r[0])) < 1e-9
+
+    # Value changes reuse the prepared system; check against a test current injected into B
+    r2.set_value(6)
+    prepared = circuit.prepared()
+    v, r, _ = circuit.thevenin([(b, None)])
+    assert circuit.prepared() is prepared
+    circuit.unsolve()
+    v_open = circuit.solve()[b]
+    IndependentCurrentSource(1, gnd, b)
+    circuit.unsolve()
+    assert abs(v[0] - v_open) < 1e-9 and abs(r[0] - (circuit.solve()[b] - v_open)) < 1e-9
+
+def test_thevenin_follows_subcircuit_definition():
+    from Circuit.Subcircuit import Subcircuit, SubcircuitInstance
+
+    definition = Circuit()
+    d_gnd = Node(definition, gnd=True)
+    port = Node(definition, name="P")
+    Resistor(1, port, d_gnd, name="R1")
+    r2 = Resistor(4, port, d_gnd, name="R2")
+    sub = Subcircuit(definition, ["P"])
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    IndependentTensionSource(10, gnd, a)
+    Resistor(1, a, b)
+    SubcircuitInstance(sub, [b], name="X")
+
+    for value in (4, 9, 1):
+        r2.set_value(value)
+        parallel = value / (1 + value)
+        v, r, _ = circuit.thevenin([(b, None)])
+        assert abs(v[0] - 10 * parallel / (1 + parallel)) < 1e-9 and abs(r[0] - parallel / (1 + parallel)) < 1e-9
+
+def test_adjoint_sensitivity():
+    import numpy as np
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    c = Node(circuit, name="C")
+    vs = IndependentTensionSource(10, gnd, a, name="VS")
+    r1 = Resistor(2, a, b, name="R1")
+    Resistor(3, b, gnd, name="R2")
+    Resistor(5, b, c, name="R3")
+    Resistor(7, c, gnd, name="R4")
+    IndependentCurrentSource(0.5, gnd, c, name="I1")
+    g = TensionDependentCurrentSource(0.1, gnd, c, b, gnd, name="G")
+    outputs = [c, r1, vs, "B", g]
+
+    def values():
+        circuit.unsolve()
+        circuit.solve()
+        return np.array([c.v, (a.v - b.v) / r1.r, -vs.i, b.v, g.multiplier * b.v])
+
+    sensitivity = circuit.sensitivity(outputs)
+    assert sensitivity.shape == (5, len(circuit.branches))
+    assert np.allclose(circuit.sensitivity(c), sensitivity[0])
+    nominal = values()
+    for branch in circuit.branches:
+        value = branch.value
+        branch.set_value(value * (1 + 1e-7))
+        numeric = (values() - nominal) / (value * 1e-7)
+        branch.set_value(value)
+        assert np.allclose(sensitivity[:, branch.id], numeric, rtol=1e-4, atol=1e-6), branch.name
+
+    # A resistor controlling a current dependent source also appears in the row of the source
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit, name="A")
+    b = Node(circuit, name="B")
+    o = Node(circuit, name="O")
+    IndependentTensionSource(10, gnd, a, name="VS")
+    r1 = Resistor(2, a, b, name="R1")
+    Resistor(3, b, gnd, name="R2")
+    CurrentDependentCurrentSource(2, gnd, o, r1, a, name="F")
+    Resistor(4, o, gnd, name="RL")
+    sensitivity = circuit.sensitivity(o)
+    assert abs(sensitivity[r1.id] + 3.2) < 1e-9
+    circuit.solve()
+    nominal = o.v
+    for branch in circuit.branches:
+        value = branch.value
+        branch.set_value(value * (1 + 1e-7))
+        circuit.unsolve()
+        circuit.solve()
+        assert abs(sensitivity[branch.id] - (o.v - nominal) / (value * 1e-7)) < 1e-4, branch.name
+        branch.set_value(value)
+
+def test_isolated_islands_solved_apart():
+    from concurrent.futures import ThreadPoolExecutor
+
+    circuit = Circuit()
+    islands = []
+    for k in range(3):
+        gnd = Node(circuit, gnd=True)
+        a = Node(circuit, name=f"A{k}")
+        b = Node(circuit, name=f"B{k}")
+        IndependentTensionSource(k + 1, gnd, a)
+        Resistor(1, a, b)
+        Resistor(k + 1, b, gnd)
+        islands.append(b)
+
+    solution = circuit.solve()
+    assert len(circuit.system.blocks()) == 3
+    expected = [(k + 1) * (k + 1) / (k + 2) for k in range(3)]
+    assert all(abs(solution[b] - v) < 1e-12 for b, v in zip(islands, expected))
+
+    circuit.unsolve()
+    with ThreadPoolExecutor(2) as pool:
+        assert circuit.solve(executor=pool) == solution
+    assert circuit.prepared().solve() == solution
+
+    # The column orders of the parts are kept for the next solve and reported
+    from Circuit.Instrumentation import Profiler
+    with Profiler() as profiler:
+        for _ in range(2):
+            circuit.unsolve()
+            assert all(abs(value - solution[var]) < 1e-12 for var, value in circuit.solve('sparse').items())
+    first, second = [p for p in profiler.phases if p['name'] == 'LinearSystem.solve']
+    assert first['blocks'] == 3 and first['ordering'] == 'mmd' and first['fill'] > 0
+    assert second['ordering'] == 'given'
+    assert [p['ordering_reused'] for p in profiler.phases if p['name'] == 'Circuit.solve'] == [False, True]
+
+    # A circuit with a single ground isn't searched for parts
+    from Circuit.LinearSystem import LinearSystem
+    single = Circuit()
+    gnd = Node(single, gnd=True)
+    Resistor(2, Node(single), gnd)
+    IndependentCurrentSource(1, gnd, single.nodes[1])
+    blocks = LinearSystem.blocks
+    LinearSystem.blocks = None
+    try:
+        assert abs(single.solve()[single.nodes[1]] - 2) < 1e-12
+    finally:
+        LinearSystem.blocks = blocks
+
+def test_fill_reducing_orderings():
+    from Circuit.Instrumentation import Profiler
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    grid = [[Node(circuit) for _ in range(15)] for _ in range(15)]
+    for i in range(15):
+        for j in range(15):
+            if i + 1 < 15:
+                Resistor(1 + (i + j) % 3, grid[i][j], grid[i + 1][j])
+            if j + 1 < 15:
+                Resistor(2, grid[i][j], grid[i][j + 1])
+    IndependentTensionSource(10, gnd, grid[0][0])
+    Resistor(1, grid[-1][-1], gnd)
+
+    expected = circuit.solve('dense')
+    fills = {}
+    for ordering in ('mmd', 'colamd', 'rcm', 'natural'):
+        circuit.unsolve()
+        with Profiler() as profiler:
+            solution = circuit.solve('sparse', ordering=ordering)
+            circuit.unsolve()
+            circuit.solve('sparse', ordering=ordering)
+        assert all(abs(solution[var] - value) < 1e-9 for var, value in expected.items())
+        first, second = [p for p in profiler.phases if p['name'] == 'LinearSystem.solve']
+        assert first['ordering'] == ordering and second['ordering'] == 'given'
+        assert [p['ordering_reused'] for p in profiler.phases if p['name'] == 'Circuit.solve'] == [False, True]
+        assert first['bandwidth'] > 0 and first['profile'] > 0
+        fills[ordering] = first['fill']
+    assert fills['mmd'] < fills['natural']
+
+def test_conjugate_gradient_backend():
+    import numpy as np
+
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    grid = [[Node(circuit) for _ in range(12)] for _ in range(12)]
+    for i in range(12):
+        for j in range(12):
+            if i + 1 < 12:
+                Resistor(1 + (i * j) % 4, grid[i][j], grid[i + 1][j])
+            if j + 1 < 12:
+                Resistor(2, grid[i][j], grid[i][j + 1])
+    Resistor(0.5, grid[0][0], gnd)
+    IndependentCurrentSource(3, grid[-1][-1], gnd)
+
+    expected = circuit.solve('dense')
+    iterations = {}
+    for preconditioner in ('jacobi', 'ic', 'none'):
+        circuit.unsolve()
+        solution = circuit.solve('cg', tol=1e-12, preconditioner=preconditioner, warm_start=False)
+        assert all(abs(solution[var] - value) < 1e-8 for var, value in expected.items())
+        convergence = circuit.system.convergence
+        assert convergence['converged'] and convergence['residual'] < 1e-11
+        assert len(convergence['residuals']) == convergence['iterations'] + 1
+        iterations[preconditioner] = convergence['iterations']
+    assert iterations['ic'] < iterations['none']
+
+    # Warm start from the previous solution
+    circuit.unsolve()
+    circuit.solve('cg', tol=1e-12)
+    assert circuit.system.convergence['iterations'] == 0
+
+    # Convergence is reported from the true residual, the one returned
+    from Circuit.ConjugateGradient import pcg
+    system = circuit.system
+    for tol, max_iter in ((1e-8, None), (1e-12, None), (1e-20, 200), (1e-3, 2)):
+        x, info = pcg(system.rows, system.cols, system.data, system.rhs, tol=tol, max_iter=max_iter)
+        residual = np.linalg.norm(system.rhs - system.to_dense() @ x) / np.linalg.norm(system.rhs)
+        assert abs(info['residual'] - residual) <= 1e-12 + 1e-6 * residual
+        assert info['converged'] == (info['residual'] <= tol)
+
+    # Iteration limit
+    circuit.unsolve()
+    with pytest.raises(np.linalg.LinAlgError):
+        circuit.solve('cg', tol=1e-12, max_iter=3, warm_start=False)
+    assert circuit.system.convergence['iterations'] == 3
+
+    # A tension source makes the system indefinite: solved by LU instead
+    circuit = Circuit()
+    gnd = Node(circuit, gnd=True)
+    a = Node(circuit)
+    b = Node(circuit)
+    IndependentTensionSource(4, gnd, a)
+    Resistor(1, a, b)
+    Resistor(1, b, gnd)
+    solution = circuit.solve('cg')
+    assert circuit.system.convergence is None and abs(solution[b] - 2) < 1e-12